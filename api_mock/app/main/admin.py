@@ -0,0 +1,117 @@
+import re
+import math
+import time
+from flask import Blueprint, g, jsonify, request
+from app.services.delay import throttle
+from app.services.profiles import BUILTIN_PROFILES, Profile, get_profile, load_profile, set_profile, stats
+
+# Define a Blueprint for admin routes, which also applies the profile to the requests of all the other routes
+routes = Blueprint("admin_routes", __name__, url_prefix="/admin")
+
+_CONVERTER = re.compile(r"<(?:[^:>]+:)?([^>]+)>")
+
+
+def _fault_response(status: int, retry_after: float = 1.0):
+    response = jsonify({"error": "Injected fault."} if status != 429 else {"error": "Rate limit exceeded."})
+    response.status_code = status
+    if status in (429, 503):
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+@routes.before_app_request
+def apply_profile():
+    """
+    Delays, rate-limits or fails the request as the profile in use says.
+    """
+    if request.blueprint == routes.name or request.url_rule is None:
+        return None
+    g.started = time.perf_counter()
+    g.endpoint = request.method + " " + _CONVERTER.sub(r"<\1>", request.url_rule.rule)
+    g.injected, g.limited, g.fault = False, False, None
+
+    profile = get_profile()
+    settings = g.settings = profile.endpoint(request.method, request.path)
+    if settings["limiter"] is not None:
+        wait = settings["limiter"].acquire()
+        if wait:
+            g.limited = True
+            return _fault_response(429, wait)
+
+    time.sleep(profile.delay(settings["latency"]))
+    status = profile.fault(settings)
+    if status is None:
+        return None
+    g.injected = True
+    # Overload responses tell the client the request was not processed, so they never come after processing
+    if settings["fail_after_processing"] and status not in (429, 503):
+        g.fault = status
+        return None
+    return _fault_response(status)
+
+
+@routes.after_app_request
+def record_request(response):
+    """
+    Replaces the response by a fault injected after processing, caps the bandwidth of the response
+    and records the request in the statistics.
+    """
+    if "started" not in g:
+        return response
+    if g.fault is not None:
+        response = _fault_response(g.fault)
+    bandwidth = g.settings["bandwidth"] if "settings" in g else 0
+    if bandwidth and not response.is_streamed:
+        response.response = throttle(response.response, bandwidth)
+    stats.record(g.endpoint, response.status_code, time.perf_counter() - g.started, g.injected, g.limited)
+    return response
+
+
+@routes.route("/profile", methods=["GET"])
+def fetch_profile():
+    """
+    Fetch the name and the settings of the profile in use, and the names of the built-in profiles.
+    """
+    profile = get_profile()
+    return jsonify({"name": profile.name, "settings": profile.settings, "builtin": list(BUILTIN_PROFILES)}), 200
+
+
+@routes.route("/profile", methods=["PUT"])
+def replace_profile():
+    """
+    Switch the profile in use: {"name": "<built-in profile>"}, or {"name": ..., "settings": {...}} with custom settings.
+    Statistics are reset, so that they describe the new profile only.
+    """
+    payload = request.get_json(force=True, silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("name"), str):
+        return jsonify({"error": "Expected a profile name."}), 400
+    try:
+        if "settings" in payload:
+            profile = Profile(payload["name"], payload["settings"])
+        elif payload["name"] in BUILTIN_PROFILES:
+            profile = load_profile(payload["name"])
+        else:
+            return jsonify({"error": f"Unknown profile '{payload['name']}'."}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    set_profile(profile)
+    stats.reset()
+    return jsonify({"name": profile.name, "settings": profile.settings}), 200
+
+
+@routes.route("/stats", methods=["GET"])
+def fetch_stats():
+    """
+    Fetch server-side statistics of the requests handled by this process.
+    """
+    return jsonify({"profile": get_profile().name, **stats.to_json()}), 200
+
+
+@routes.route("/stats", methods=["DELETE"])
+def reset_stats():
+    """
+    Reset the statistics.
+    """
+    stats.reset()
+    return jsonify({"error": False}), 200
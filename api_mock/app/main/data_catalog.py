@@ -1,5 +1,5 @@
-from flask import Blueprint
-from app.services.data_catalog import get_resource_metadata
+from flask import Blueprint, Response, jsonify, request
+from app.services.data_catalog import get_resource_metadata, DEFAULT_PAGE_SIZE
 
 # Define a Blueprint for data catalog routes
 routes = Blueprint("data_catalog_routes", __name__, url_prefix="/data_catalog")
@@ -8,6 +8,15 @@ routes = Blueprint("data_catalog_routes", __name__, url_prefix="/data_catalog")
 @routes.route("/<string:resource_type>", methods=["GET"])
 def get_resource(resource_type):
     """
-    Fetch metadata for the given resource type.
+    Fetch a page of metadata for the given resource type.
+    Responds with 304 Not Modified if the page matches the ETag sent in If-None-Match header.
     """
-    return get_resource_metadata(resource_type), 200
+    try:
+        page_size = request.args.get("pageSize", DEFAULT_PAGE_SIZE, type=int)
+        body, etag = get_resource_metadata(resource_type, page_size, request.args.get("pageToken"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(body, status=200, mimetype="application/json")
+    response.set_etag(etag)
+    return response.make_conditional(request)
@@ -1,16 +1,77 @@
-from flask import Blueprint, jsonify, request
+import json
+from flask import Blueprint, Response, jsonify, request
 from app.services.dataplex_catalog import (
     check_resouce_is_valid,
     initiate_resource_transfer,
-    mark_as_transferred_after_timeout,
+    initiate_batch_transfer,
     get_resource_data,
+    get_transfer_statuses,
+    watch_finished_transfers,
+    storage,
 )
-from app.services.delay import run_coroutine
 
 # Define a Blueprint for dataplex catalog routes
 routes = Blueprint("dataplex_catalog_routes", __name__, url_prefix="/dataplex_catalog")
 
 
+@routes.route("/batch", methods=["POST"])
+def transfer_batch():
+    """
+    Initiate transfer of many resources at once, reporting acceptance per resource.
+    With "replace" set to true, already transferred resources are transferred again instead of being rejected.
+    """
+    payload = request.get_json(force=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("resources"), list):
+        return jsonify({"error": "Expected a list of resources."}), 400
+
+    results = initiate_batch_transfer(payload["resources"], payload.get("replace") is True)
+    return jsonify({"results": results}), 200
+
+
+@routes.route("/status", methods=["GET", "POST"])
+def fetch_transfer_statuses():
+    """
+    Fetch transfer status of many resources at once.
+    Ids are passed as comma-separated "ids" query parameter (GET) or as "ids" list in JSON body (POST).
+    """
+    if request.method == "GET":
+        ids = [id for id in request.args.get("ids", "").split(",") if id]
+    else:
+        payload = request.get_json(force=True)
+        if not isinstance(payload, dict) or not isinstance(payload.get("ids"), list):
+            return jsonify({"error": "Expected a list of ids."}), 400
+        ids = payload["ids"]
+
+    return jsonify(get_transfer_statuses(ids)), 200
+
+
+@routes.route("/watch", methods=["GET"])
+def watch_transfers():
+    """
+    Stream ids of finished transfers as Server-Sent Events: a "ready" event once subscribed, then a
+    "finished" event with {"ids": [...]} whenever transfers finish, and comments while idle.
+    Every event id is a cursor, the stream resumes after it when sent back as Last-Event-ID header
+    (or "since" query parameter).
+    """
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        since = float(since) if since else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+
+    def stream():
+        yield "retry: 1000\n\n"
+        for index, (cursor, ids) in enumerate(watch_finished_transfers(since)):
+            if index == 0:
+                yield f"event: ready\nid: {cursor!r}\ndata: {{}}\n\n"
+            elif ids:
+                yield f"event: finished\nid: {cursor!r}\ndata: {json.dumps({'ids': ids})}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @routes.route("/<string:resource_type>/<string:resource_id>", methods=["POST"])
 def transfer_entry_group(resource_type, resource_id):
     """
@@ -18,17 +79,16 @@ def transfer_entry_group(resource_type, resource_id):
     """
     resource_data = request.get_json(force=True)
 
-    try:
-        check_resouce_is_valid(resource_type, resource_id, resource_data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
-
-    try:
-        initiate_resource_transfer(resource_id, resource_data)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    with storage.transaction():
+        try:
+            check_resouce_is_valid(resource_type, resource_id, resource_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
 
-    run_coroutine(mark_as_transferred_after_timeout(resource_id))
+        try:
+            initiate_resource_transfer(resource_id, resource_data)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
 
     return jsonify({"error": False}), 202
 
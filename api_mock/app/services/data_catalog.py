@@ -1,19 +1,172 @@
+import os
 import json
+import mmap
+import hashlib
+import threading
+from array import array
 from pathlib import Path
+from contextlib import contextmanager
 
-DATA_FILE_PATH = Path(__file__).parent.parent / "mock_data" / "mock_data.json"
+DATA_FILE_PATH = Path(
+    os.environ.get(
+        "DATA_CATALOG_MOCK_DATA", Path(__file__).parent.parent / "mock_data" / "mock_data.json"
+    )
+)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-def load_mock_data():
+# Data files with one resource per line, instead of a single JSON array
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+
+
+class CatalogIndex:
+    """
+    Resources of the data file indexed by type, each of them kept serialized, so that pages are
+    served without parsing or serializing resources again.
+
+    JSON Lines files are memory-mapped and only the positions of the lines are kept, which allows
+    serving datasets of millions of resources. JSON array files are loaded whole. Pages are read
+    between acquire and release, and the file is unmapped once the index is closed and no page
+    is being read anymore.
+    """
+    def __init__(self, path: Path, version: tuple):
+        """
+        Indexes the data file. Version identifies the content of the file (its mtime and size).
+        """
+        self.version = version
+        self.etag_prefix = hashlib.blake2b(repr((str(path), version)).encode(), digest_size=8).hexdigest()
+        self._serialized = {}
+        self._positions = {}
+        self._mmap = None
+        self._readers = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        if path.suffix in JSON_LINES_SUFFIXES:
+            self._index_json_lines(path)
+        else:
+            self._index_json(path)
+
+    def _index_json(self, path: Path):
+        with open(path, "r") as file:
+            data = json.load(file)
+        for resource in data:
+            if "type" in resource:
+                serialized = json.dumps(resource, separators=(",", ":")).encode()
+                self._serialized.setdefault(resource["type"], []).append(serialized)
+
+    def _index_json_lines(self, path: Path):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            self._mmap = data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start = 0
+        while start < len(data):
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = len(data)
+            line = data[start:end].strip()
+            if line:
+                resource = json.loads(line)
+                if "type" in resource:
+                    # Start and end of each line, the line itself stays in the mapped file
+                    self._positions.setdefault(resource["type"], array("q")).extend((start, end))
+            start = end + 1
+
+    def acquire(self):
+        """
+        Starts reading pages, keeping the file mapped until release.
+        """
+        with self._lock:
+            self._readers += 1
+
+    def release(self):
+        """
+        Stops reading pages, unmapping the file if the index was closed meanwhile.
+        """
+        with self._lock:
+            self._readers -= 1
+            self._unmap_if_unused()
+
+    def close(self):
+        """
+        Unmaps the file as soon as no page is being read.
+        """
+        with self._lock:
+            self._closed = True
+            self._unmap_if_unused()
+
+    def _unmap_if_unused(self):
+        if self._closed and self._readers == 0 and self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def count(self, type: str) -> int:
+        """
+        Returns the number of resources of the type.
+        """
+        if type in self._serialized:
+            return len(self._serialized[type])
+        return len(self._positions.get(type, ())) // 2
+
+    def serialized_page(self, type: str, offset: int, page_size: int) -> list[bytes]:
+        """
+        Returns serialized resources of the type, starting at the offset.
+        """
+        if type in self._serialized:
+            return self._serialized[type][offset : offset + page_size]
+        positions = self._positions.get(type, array("q"))[2 * offset : 2 * (offset + page_size)]
+        return [self._mmap[positions[i] : positions[i + 1]].strip() for i in range(0, len(positions), 2)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@contextmanager
+def catalog_index():
     """
-    Load mock data from the JSON file.
+    Provides the index of the data file for reading pages, indexing the file again whenever its
+    mtime or size changes. The previous index is closed once it is replaced.
     """
-    with open(DATA_FILE_PATH, "r") as file:
-        return json.load(file)
+    global _index
+
+    stat = os.stat(DATA_FILE_PATH)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        if _index is None or _index.version != version:
+            previous, _index = _index, CatalogIndex(DATA_FILE_PATH, version)
+            if previous is not None:
+                previous.close()
+        index = _index
+        index.acquire()
+    try:
+        yield index
+    finally:
+        index.release()
 
 
-def get_resource_metadata(type) -> list[dict]:
+def get_resource_metadata(type, page_size=DEFAULT_PAGE_SIZE, page_token=None) -> tuple[bytes, str]:
     """
-    Get resource metadata filtered by type.
+    Get a page of resource metadata filtered by type, serialized as JSON, together with its ETag.
+    The page token is an opaque string returned as "nextPageToken" of the previous page.
     """
-    data = load_mock_data()
-    return list(filter(lambda e: "type" in e and e["type"] == type, data))
+    if page_size < 1:
+        raise ValueError("Page size must be positive.")
+    page_size = min(page_size, MAX_PAGE_SIZE)
+
+    offset = 0
+    if page_token:
+        if not page_token.isdigit():
+            raise ValueError("Invalid page token.")
+        offset = int(page_token)
+
+    with catalog_index() as index:
+        body = b'{"resources":[' + b",".join(index.serialized_page(type, offset, page_size)) + b"]"
+        if offset + page_size < index.count(type):
+            body += b',"nextPageToken":"' + str(offset + page_size).encode() + b'"'
+        body += b"}"
+
+    # The page is identified by version of the data file and its position
+    etag = f"{index.etag_prefix}-{type}-{offset}-{page_size}"
+    return body, etag
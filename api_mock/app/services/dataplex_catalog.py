@@ -1,52 +1,127 @@
-from asyncio import sleep
+import time
+from app.services.storage import create_storage
+from app.services.profiles import get_profile
 
-storage = {}
+# Longest time a watch waits before checking the storage again, and before telling an idle watcher it's alive
+WATCH_CHECK_INTERVAL = 0.25
+WATCH_KEEPALIVE_INTERVAL = 5.0
+# Transfers stored with a finish time up to this many seconds in the past are still reported by a watch
+WATCH_GRACE = 1.0
 
+# Transferred resources with the time their transfer finishes at, configured by DATAPLEX_MOCK_STORAGE
+storage = create_storage()
 
-def check_resouce_is_valid(type: str, id: str, data: dict) -> None:  # for transfer
+
+def check_resouce_is_valid(type: str, id: str, data: dict, replace: bool = False) -> None:  # for transfer
     """
     Validates if the resource can be transferred based on the type, id, and dependencies.
+    Already transferred resource can only be transferred again to replace it.
+    Must be called in a storage transaction together with initiating the transfer.
     """
     if type not in ["TagTemplate", "EntryGroup"]:
         raise Exception("Type unrecognized.")
-    if id in storage:
+    if not replace and storage.get(id) is not None:
         raise Exception("Duplicate resource id.")
     if "type" not in data:
         raise Exception("Resource type not specified.")
     if "dependencies" in data:
+        finish_times = storage.finish_times(data["dependencies"])
+        now = time.time()
         for dependency in data["dependencies"]:
-            if dependency not in storage:
+            if dependency not in finish_times:
                 raise Exception("Can not satisfy dependencies.")
-            if not storage[dependency]["transfer_finished"]:
+            if finish_times[dependency] > now:
                 raise Exception("Dependency not yet transferred.")
 
 
 def initiate_resource_transfer(id: str, data: dict) -> None:
     """
-    Initiates the transfer of a resource by adding it to the storage with a 'transfer_finished' flag set to False.
+    Initiates the transfer of a resource by adding it to the storage, the transfer finishes after
+    a delay drawn from the transfer_delay of the profile in use.
     """
-    storage[id] = data
-    storage[id]["transfer_finished"] = False
+    data.pop("transfer_finished", None)
+    profile = get_profile()
+    storage.put(id, data, time.time() + profile.delay(profile.transfer_delay))
 
 
-async def mark_as_transferred_after_timeout(id):
+def initiate_batch_transfer(resources: list, replace: bool = False) -> list[dict]:
     """
-    Marks a resource as transferred after waiting for 10 seconds. This simulates a delayed transfer process.
+    Validates and initiates the transfer of every resource in the batch, in order.
+    Returns per-resource results, so that rejecting one resource does not reject the whole batch.
     """
-    await sleep(10)
-    storage[id]["transfer_finished"] = True
+    results = []
+    with storage.transaction():
+        for data in resources:
+            if not isinstance(data, dict) or "id" not in data:
+                results.append({"id": None, "accepted": False, "error": "Resource id not specified."})
+                continue
+            try:
+                check_resouce_is_valid(data.get("type"), data["id"], data, replace)
+                initiate_resource_transfer(data["id"], data)
+            except Exception as e:
+                results.append({"id": data["id"], "accepted": False, "error": str(e)})
+                continue
+            results.append({"id": data["id"], "accepted": True})
+    return results
 
 
 def get_resource_data(type: str, id: str) -> dict:
     """
     Retrieves the data for a specific resource identified by its type and id.
     """
-    if id not in storage:
+    record = storage.get(id)
+    if record is None:
         raise Exception("Not Found.")
 
-    resource = storage[id]
+    resource, finishes_at = record
 
     if resource["type"] != type:
         raise Exception("Not Found.")
 
-    return resource
+    return {**resource, "transfer_finished": finishes_at <= time.time()}
+
+
+def get_transfer_statuses(ids: list[str]) -> dict:
+    """
+    Retrieves the 'transfer_finished' flag for each of the given resource ids.
+    """
+    finish_times = storage.finish_times(ids)
+    now = time.time()
+    statuses, not_found = {}, []
+    for id in ids:
+        if id in finish_times:
+            statuses[id] = finish_times[id] <= now
+        else:
+            not_found.append(id)
+    return {"statuses": statuses, "not_found": not_found}
+
+
+def watch_finished_transfers(since: float | None = None):
+    """
+    Yields (cursor, ids) of transfers as they finish, starting after the cursor `since` (now if not given).
+    The cursor is the time up to which finished transfers were reported. Transfers stored late, with a finish
+    time already in the past, are reported as long as it is within WATCH_GRACE seconds of the cursor, so
+    that a few may be reported twice. An empty list of ids is yielded first and then every
+    WATCH_KEEPALIVE_INTERVAL seconds without any transfer finishing.
+    """
+    cursor = time.time() if since is None else since
+    reported = {}
+    yield cursor, []
+    idle_since = time.time()
+    while True:
+        now = time.time()
+        ids = []
+        for id, finishes_at in storage.finished_between(cursor - WATCH_GRACE, now):
+            if reported.get(id) != finishes_at:
+                reported[id] = finishes_at
+                ids.append(id)
+        cursor = max(cursor, now)
+        reported = {id: at for id, at in reported.items() if at > cursor - WATCH_GRACE}
+
+        if ids or now - idle_since >= WATCH_KEEPALIVE_INTERVAL:
+            idle_since = now
+            yield cursor, ids
+
+        next_finish = storage.next_finish_time(now)
+        delay = WATCH_CHECK_INTERVAL if next_finish is None else min(WATCH_CHECK_INTERVAL, next_finish - now)
+        time.sleep(max(delay, 0.001))
@@ -1,84 +1,98 @@
-import asyncio
-import itertools
+import math
+import time
+import random
 import threading
 
-__all__ = ["EventLoopThread", "get_event_loop", "stop_event_loop", "run_coroutine"]
+# Distributions of delays, with the parameters each of them takes
+DISTRIBUTIONS = {
+    "constant": ("mean",),
+    "uniform": ("min", "max"),
+    "exponential": ("mean",),
+    "lognormal": ("mean", "sigma"),
+}
 
-class EventLoopThread(threading.Thread):
-    loop = None
-    _count = itertools.count(0)
 
-    def __init__(self):
-        self.started = threading.Event()
-        name = f"{type(self).__name__}-{next(self._count)}"
-        super().__init__(name=name, daemon=True)
-
-    def __repr__(self):
-        loop, r, c, d = self.loop, False, True, False
-        if loop is not None:
-            r, c, d = loop.is_running(), loop.is_closed(), loop.get_debug()
-        return (
-            f"<{type(self).__name__} {self.name} id={self.ident} "
-            f"running={r} closed={c} debug={d}>"
-        )
-
-    def run(self):
-        self.loop = loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.call_later(0, self.started.set)
-
-        try:
-            loop.run_forever()
-        finally:
-            try:
-                shutdown_asyncgens = loop.shutdown_asyncgens()
-            except AttributeError:
-                pass
-            else:
-                loop.run_until_complete(shutdown_asyncgens)
-            try:
-                shutdown_executor = loop.shutdown_default_executor()
-            except AttributeError:
-                pass
-            else:
-                loop.run_until_complete(shutdown_executor)
-            asyncio.set_event_loop(None)
-            loop.close()
-
-    def stop(self):
-        loop, self.loop = self.loop, None
-        if loop is None:
-            return
-        loop.call_soon_threadsafe(loop.stop)
-        self.join()
-
-_lock = threading.Lock()
-_loop_thread = None
+def check_delay(spec) -> None:
+    """
+    Validates a delay spec: a number of seconds, or a dict with "distribution" and its parameters.
+    Raises ValueError if it is not valid.
+    """
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        if spec < 0:
+            raise ValueError("Delay must not be negative.")
+        return
+    if not isinstance(spec, dict) or spec.get("distribution") not in DISTRIBUTIONS:
+        raise ValueError(f"Delay must be a number or a dict with distribution one of {', '.join(DISTRIBUTIONS)}.")
+    parameters = DISTRIBUTIONS[spec["distribution"]]
+    for name, value in spec.items():
+        if name == "distribution":
+            continue
+        if name not in parameters:
+            raise ValueError(f"Unexpected parameter '{name}' of {spec['distribution']} distribution.")
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"Parameter '{name}' must be a non-negative number.")
+    missing = [name for name in parameters if name not in spec and name != "sigma"]
+    if missing:
+        raise ValueError(f"Missing parameters of {spec['distribution']} distribution: {', '.join(missing)}.")
 
-def get_event_loop():
-    global _loop_thread
 
-    if _loop_thread is None:
-        with _lock:
-            if _loop_thread is None:
-                _loop_thread = EventLoopThread()
-                _loop_thread.start()
-                # give the thread up to a second to produce a loop
-                _loop_thread.started.wait(1)
+def sample_delay(spec, rng: random.Random) -> float:
+    """
+    Draws a delay in seconds from a spec validated by check_delay. Lognormal delays have the given
+    mean, sigma (default 0.5) is the standard deviation of their logarithm.
+    """
+    if not isinstance(spec, dict):
+        return float(spec)
+    distribution = spec["distribution"]
+    if distribution == "uniform":
+        return rng.uniform(spec["min"], spec["max"])
+    mean = spec["mean"]
+    if mean <= 0:
+        return 0.0
+    if distribution == "exponential":
+        return rng.expovariate(1 / mean)
+    if distribution == "lognormal":
+        sigma = spec.get("sigma", 0.5)
+        return rng.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+    return float(mean)
 
-    return _loop_thread.loop
 
-def stop_event_loop():
-    global _loop_thread
-    with _lock:
-        if _loop_thread is not None:
-            _loop_thread.stop()
-            _loop_thread = None
+class TokenBucket:
+    """
+    Rate limit of rate requests per second on average, in bursts of up to burst requests.
+    Shared by all the threads of the process.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-def run_coroutine(coro):
-    """Run the coroutine in the event loop running in a separate thread
+    def acquire(self) -> float:
+        """
+        Takes a token if there is one and returns 0, otherwise returns seconds until there will be one.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
 
-    Returns a Future, call Future.result() to get the output
 
+def throttle(chunks, bytes_per_second: float):
+    """
+    Yields the chunks of a response body in pieces of a tenth of a second, sleeping between them
+    so that the body is sent at no more than bytes_per_second.
     """
-    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
\ No newline at end of file
+    piece = max(1, int(bytes_per_second / 10))
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        for start in range(0, len(chunk), piece):
+            data = chunk[start : start + piece]
+            time.sleep(len(data) / bytes_per_second)
+            yield data
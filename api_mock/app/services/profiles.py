@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import bisect
+import random
+import threading
+from app.services.delay import TokenBucket, check_delay, sample_delay
+
+# Seconds it takes for a transfer to finish, unless the profile says otherwise
+DEFAULT_TRANSFER_DELAY = float(os.environ.get("DATAPLEX_TRANSFER_DELAY", 10))
+
+# Settings of an endpoint, and their values when the profile does not set them
+ENDPOINT_DEFAULTS = {
+    # Delay before the request is handled
+    "latency": 0,
+    # Share of requests answered with the given status instead, e.g. {"503": 0.05, "429": 0.01}
+    "faults": {},
+    # Whether injected faults (but 429 and 503) replace the response of a handled request, instead of rejecting it
+    "fail_after_processing": False,
+    # Requests per second allowed on average (0 for unlimited) and in a burst, others get 429
+    "rate_limit": 0,
+    "burst": 1,
+    # Bytes per second the response body is sent at (0 for unlimited)
+    "bandwidth": 0,
+}
+
+# Profiles available by name. Each one sets the endpoints matching a pattern: "*" for all of them,
+# "/path" for requests of any method to paths starting with it, or "METHOD /path". The settings of
+# the most specific pattern matching a request (the longest path, then the one with a method) win over
+# the ones of less specific patterns. Every pattern with a rate limit has a token bucket of its own.
+BUILTIN_PROFILES = {
+    "default": {},
+    "realistic": {
+        "endpoints": {
+            "*": {"latency": {"distribution": "lognormal", "mean": 0.03, "sigma": 0.5}},
+            "GET /data_catalog": {"latency": {"distribution": "lognormal", "mean": 0.15, "sigma": 0.5}},
+        },
+        "transfer_delay": {"distribution": "lognormal", "mean": DEFAULT_TRANSFER_DELAY, "sigma": 0.3},
+    },
+    "flaky": {
+        "endpoints": {
+            "*": {"latency": {"distribution": "exponential", "mean": 0.05}},
+            "/dataplex_catalog": {"faults": {"500": 0.02, "503": 0.03, "429": 0.02}},
+            "POST /dataplex_catalog/batch": {"fail_after_processing": True},
+        },
+        "transfer_delay": {"distribution": "exponential", "mean": DEFAULT_TRANSFER_DELAY},
+    },
+    "overloaded": {
+        "endpoints": {
+            "*": {"latency": {"distribution": "lognormal", "mean": 0.2, "sigma": 1.0}},
+            "/dataplex_catalog": {"faults": {"503": 0.05}, "rate_limit": 50, "burst": 20},
+        },
+    },
+    "slow-network": {
+        "endpoints": {"*": {"latency": 0.1, "bandwidth": 256 * 1024}},
+    },
+}
+
+
+class Profile:
+    """
+    Latency, fault injection, rate limit and bandwidth settings of the mock's endpoints, together
+    with the distribution of transfer completion delays. Random draws are seeded, so a profile
+    produces the same sequence of delays and faults every time it is loaded.
+    """
+    def __init__(self, name: str, settings: dict):
+        """
+        Builds a profile of its settings, raising ValueError if they are not valid.
+        """
+        if not isinstance(settings, dict):
+            raise ValueError("Profile must be an object.")
+        unexpected = set(settings) - {"endpoints", "transfer_delay", "seed"}
+        if unexpected:
+            raise ValueError(f"Unexpected profile settings: {', '.join(sorted(unexpected))}.")
+        endpoints = settings.get("endpoints", {})
+        if not isinstance(endpoints, dict):
+            raise ValueError("Profile endpoints must be an object.")
+
+        self.name = name
+        self.settings = settings
+        self.transfer_delay = settings.get("transfer_delay", DEFAULT_TRANSFER_DELAY)
+        check_delay(self.transfer_delay)
+        self._random = random.Random(settings.get("seed", 0))
+
+        # Settings of every pattern merged over the ones of the most specific pattern covering it,
+        # from the least specific pattern to the most specific one
+        parsed = sorted(
+            ((_parse_pattern(pattern), pattern) for pattern in endpoints),
+            key=lambda item: (len(item[0][1]), item[0][0] is not None),
+        )
+        self._endpoints = []
+        for (method, prefix), pattern in parsed:
+            _check_endpoint(pattern, endpoints[pattern])
+            merged = dict(ENDPOINT_DEFAULTS)
+            for (general_method, general_prefix), general_settings in reversed(self._endpoints):
+                if prefix.startswith(general_prefix) and general_method in (None, method):
+                    merged.update(general_settings)
+                    break
+            merged.update(endpoints[pattern])
+            self._endpoints.append(((method, prefix), merged))
+        for _, settings in self._endpoints:
+            settings["limiter"] = TokenBucket(settings["rate_limit"], settings["burst"]) if settings["rate_limit"] else None
+        self._default = dict(ENDPOINT_DEFAULTS, limiter=None)
+
+    def endpoint(self, method: str, path: str) -> dict:
+        """
+        Returns the settings of the endpoint the request is sent to.
+        """
+        for (pattern_method, prefix), settings in reversed(self._endpoints):
+            if path.startswith(prefix) and pattern_method in (None, method):
+                return settings
+        return self._default
+
+    def draw(self) -> float:
+        """
+        Returns a random number in [0, 1) of the profile's seeded sequence.
+        """
+        return self._random.random()
+
+    def delay(self, spec) -> float:
+        """
+        Draws a delay from the spec, see sample_delay.
+        """
+        return sample_delay(spec, self._random)
+
+    def fault(self, settings: dict) -> int | None:
+        """
+        Returns the status of a fault to inject into the request, if any.
+        """
+        if not settings["faults"]:
+            return None
+        draw = self.draw()
+        for status, rate in settings["faults"].items():
+            if draw < rate:
+                return int(status)
+            draw -= rate
+        return None
+
+
+def _parse_pattern(pattern: str) -> tuple[str | None, str]:
+    """
+    Returns the method (None for any) and the path prefix of an endpoint pattern.
+    """
+    if pattern == "*":
+        return None, ""
+    if pattern.startswith("/"):
+        return None, pattern
+    method, _, prefix = pattern.partition(" ")
+    return method, prefix
+
+
+def _check_endpoint(pattern: str, settings: dict) -> None:
+    """
+    Validates the settings of an endpoint pattern, raising ValueError if they are not valid.
+    """
+    if not (pattern == "*" or pattern.startswith("/") or (" /" in pattern and pattern.split(" ")[0].isupper())):
+        raise ValueError(f"Endpoint pattern '{pattern}' must be '*', '/path' or 'METHOD /path'.")
+    if not isinstance(settings, dict):
+        raise ValueError(f"Settings of endpoint '{pattern}' must be an object.")
+    unexpected = set(settings) - set(ENDPOINT_DEFAULTS)
+    if unexpected:
+        raise ValueError(f"Unexpected settings of endpoint '{pattern}': {', '.join(sorted(unexpected))}.")
+    check_delay(settings.get("latency", 0))
+    faults = settings.get("faults", {})
+    if not isinstance(faults, dict):
+        raise ValueError(f"Faults of endpoint '{pattern}' must be an object.")
+    for status, rate in faults.items():
+        if not str(status).isdigit() or not 400 <= int(status) <= 599:
+            raise ValueError(f"Fault status '{status}' of endpoint '{pattern}' must be a 4xx or 5xx status.")
+        if not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+            raise ValueError(f"Fault rate of status {status} of endpoint '{pattern}' must be between 0 and 1.")
+    if sum(faults.values()) > 1:
+        raise ValueError(f"Fault rates of endpoint '{pattern}' must not add up to more than 1.")
+    for name in ("rate_limit", "bandwidth"):
+        value = settings.get(name, 0)
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"Setting '{name}' of endpoint '{pattern}' must be a non-negative number.")
+    if not isinstance(settings.get("burst", 1), int) or settings.get("burst", 1) < 1:
+        raise ValueError(f"Setting 'burst' of endpoint '{pattern}' must be a positive integer.")
+
+
+def load_profile(spec: str) -> Profile:
+    """
+    Loads the profile named by spec, either a built-in one or a path of a JSON file with its settings.
+    """
+    if spec in BUILTIN_PROFILES:
+        return Profile(spec, BUILTIN_PROFILES[spec])
+    try:
+        with open(spec, "r", encoding="utf-8") as file:
+            settings = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(
+            f"Profile '{spec}' is neither one of {', '.join(BUILTIN_PROFILES)} nor a readable JSON file: {e}"
+        ) from e
+    return Profile(os.path.basename(spec), settings)
+
+
+class RequestStats:
+    """
+    Server-side statistics of the requests handled by the process, per endpoint: counts of the
+    statuses responded with, of injected faults and rate-limited requests, and a histogram of the
+    handling time (streamed bodies are not included).
+    """
+    # Upper bounds of histogram buckets, in seconds
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all the requests recorded so far.
+        """
+        with self._lock:
+            self._since = time.time()
+            self._endpoints = {}
+
+    def record(self, endpoint: str, status: int, seconds: float, injected: bool = False, limited: bool = False):
+        """
+        Records a handled request.
+        """
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    "statuses": {},
+                    "injected_faults": 0,
+                    "rate_limited": 0,
+                    "buckets": [0] * (len(self.BUCKETS) + 1),
+                    "sum": 0.0,
+                    "max": 0.0,
+                }
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            stats["injected_faults"] += injected
+            stats["rate_limited"] += limited
+            stats["buckets"][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            stats["sum"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def _quantile(self, buckets: list[int], share: float) -> float | None:
+        """
+        Estimates the quantile as the upper bound of the bucket it falls into.
+        """
+        rank, seen = share * sum(buckets), 0
+        for bound, count in zip(self.BUCKETS, buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_json(self) -> dict:
+        """
+        Returns the statistics, with request rates over the time since they were reset.
+        """
+        with self._lock:
+            elapsed = max(time.time() - self._since, 1e-9)
+            endpoints = {}
+            for endpoint, stats in sorted(self._endpoints.items()):
+                requests = sum(stats["statuses"].values())
+                endpoints[endpoint] = {
+                    "requests": requests,
+                    "requests_per_second": round(requests / elapsed, 3),
+                    "statuses": {str(status): count for status, count in sorted(stats["statuses"].items())},
+                    "injected_faults": stats["injected_faults"],
+                    "rate_limited": stats["rate_limited"],
+                    "seconds": {
+                        "mean": round(stats["sum"] / requests, 6),
+                        "p50": self._quantile(stats["buckets"], 0.5),
+                        "p95": self._quantile(stats["buckets"], 0.95),
+                        "p99": self._quantile(stats["buckets"], 0.99),
+                        "max": round(stats["max"], 6),
+                    },
+                }
+            return {"since": self._since, "elapsed_seconds": round(elapsed, 3), "endpoints": endpoints}
+
+
+# Profile in use, configured by MOCK_PROFILE, and statistics of the process
+_profile = load_profile(os.environ.get("MOCK_PROFILE", "default"))
+stats = RequestStats()
+
+
+def get_profile() -> Profile:
+    """
+    Returns the profile in use.
+    """
+    return _profile
+
+
+def set_profile(profile: Profile) -> None:
+    """
+    Switches the profile in use, starting its random sequence and rate limits from scratch.
+    """
+    global _profile
+    _profile = profile
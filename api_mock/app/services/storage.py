@@ -0,0 +1,213 @@
+import os
+import json
+import heapq
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Largest number of ids queried with a single SQLite statement
+SQLITE_QUERY_CHUNK = 900
+
+
+class MemoryStorage:
+    """
+    Keeps transferred resources in a dict of the process, guarded by a lock.
+    Each record is a tuple of resource data and the time its transfer finishes at.
+
+    Finish times of running transfers are kept in a heap, and moved to a list sorted by time once
+    they are over, so that storing a resource takes logarithmic time. Entries of replaced records
+    are skipped when read, and dropped once there are more of them than records.
+    """
+    def __init__(self):
+        self._records = {}
+        self._running = []
+        self._finished = []
+        self._stale = 0
+        self._lock = threading.Lock()
+        # Guards the finish times, which are read outside of transactions
+        self._finishes_lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block exclusively, so that checking and storing resources does not race.
+        """
+        with self._lock:
+            yield
+
+    def get(self, id: str) -> tuple[dict, float] | None:
+        """
+        Returns the data and the finish time of the resource, or None if it is not stored.
+        """
+        return self._records.get(id)
+
+    def finish_times(self, ids: list[str]) -> dict[str, float]:
+        """
+        Returns the finish time of each of the given resources which are stored.
+        """
+        records = self._records
+        return {id: records[id][1] for id in ids if id in records}
+
+    def put(self, id: str, data: dict, finishes_at: float) -> None:
+        """
+        Stores the resource, replacing the previous one with the same id.
+        """
+        with self._finishes_lock:
+            if id in self._records:
+                self._stale += 1
+            self._records[id] = (data, finishes_at)
+            heapq.heappush(self._running, (finishes_at, id))
+            if self._stale > len(self._records):
+                self._compact()
+
+    def _compact(self):
+        """
+        Drops the finish times of replaced records.
+        """
+        records = self._records
+        self._running = [(at, id) for at, id in self._running if records[id][1] == at]
+        heapq.heapify(self._running)
+        self._finished = [(at, id) for at, id in self._finished if records[id][1] == at]
+        self._stale = 0
+
+    def _settle(self, until: float):
+        """
+        Moves the finish times up to the given time from the heap of running transfers to the finished ones.
+        """
+        running, finished = self._running, self._finished
+        while running and running[0][0] <= until:
+            entry = heapq.heappop(running)
+            if finished and entry < finished[-1]:
+                # Only when the clock went back
+                bisect.insort(finished, entry)
+            else:
+                finished.append(entry)
+
+    def finished_between(self, after: float, until: float) -> list[tuple[str, float]]:
+        """
+        Returns ids and finish times of the resources finishing after the first time, up to the second one.
+        """
+        with self._finishes_lock:
+            self._settle(until)
+            records, finished = self._records, self._finished
+            start = bisect.bisect_right(finished, (after, "\U0010ffff"))
+            end = bisect.bisect_right(finished, (until, "\U0010ffff"))
+            return [(id, at) for at, id in finished[start:end] if records[id][1] == at]
+
+    def next_finish_time(self, after: float) -> float | None:
+        """
+        Returns the earliest finish time later than the given one, or None if there is none.
+        """
+        with self._finishes_lock:
+            self._settle(after)
+            finished = self._finished
+            index = bisect.bisect_right(finished, (after, "\U0010ffff"))
+            if index < len(finished):
+                return finished[index][0]
+            return self._running[0][0] if self._running else None
+
+
+class SqliteStorage:
+    """
+    Keeps transferred resources in an SQLite database, which is shared by all the threads and
+    processes using the same file. Each thread has a connection of its own.
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        with self.transaction():
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS resources "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL, finishes_at REAL NOT NULL)"
+            )
+            self._connection().execute(
+                "CREATE INDEX IF NOT EXISTS resources_finishes_at ON resources (finishes_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Transactions are managed explicitly by the transaction method
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block in a write transaction, which excludes writers of all the other connections.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get(self, id: str) -> tuple[dict, float] | None:
+        """
+        Returns the data and the finish time of the resource, or None if it is not stored.
+        """
+        row = self._connection().execute(
+            "SELECT data, finishes_at FROM resources WHERE id = ?", (id,)
+        ).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def finish_times(self, ids: list[str]) -> dict[str, float]:
+        """
+        Returns the finish time of each of the given resources which are stored.
+        """
+        connection, result = self._connection(), {}
+        for start in range(0, len(ids), SQLITE_QUERY_CHUNK):
+            chunk = ids[start : start + SQLITE_QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            result.update(
+                connection.execute(
+                    f"SELECT id, finishes_at FROM resources WHERE id IN ({placeholders})", chunk
+                )
+            )
+        return result
+
+    def put(self, id: str, data: dict, finishes_at: float) -> None:
+        """
+        Stores the resource, replacing the previous one with the same id.
+        """
+        self._connection().execute(
+            "INSERT OR REPLACE INTO resources (id, data, finishes_at) VALUES (?, ?, ?)",
+            (id, json.dumps(data), finishes_at),
+        )
+
+    def finished_between(self, after: float, until: float) -> list[tuple[str, float]]:
+        """
+        Returns ids and finish times of the resources finishing after the first time, up to the second one.
+        """
+        return self._connection().execute(
+            "SELECT id, finishes_at FROM resources WHERE finishes_at > ? AND finishes_at <= ? ORDER BY finishes_at",
+            (after, until),
+        ).fetchall()
+
+    def next_finish_time(self, after: float) -> float | None:
+        """
+        Returns the earliest finish time later than the given one, or None if there is none.
+        """
+        return self._connection().execute(
+            "SELECT MIN(finishes_at) FROM resources WHERE finishes_at > ?", (after,)
+        ).fetchone()[0]
+
+
+def create_storage(url: str | None = None):
+    """
+    Creates the storage described by the url: "memory" (default) or "sqlite:<path of database file>".
+    The url is read from DATAPLEX_MOCK_STORAGE environment variable if not given.
+    """
+    url = url or os.environ.get("DATAPLEX_MOCK_STORAGE", "memory")
+    if url == "memory":
+        return MemoryStorage()
+    if url.startswith("sqlite:") and len(url) > len("sqlite:"):
+        return SqliteStorage(url[len("sqlite:") :])
+    raise ValueError(f"Unsupported storage: '{url}'.")
@@ -1,3 +1,4 @@
+import os
 from app.main import create_app
 
 # Create the Flask application instance
@@ -7,4 +8,4 @@ if __name__ == "__main__":
     """
     Run the Flask application if this script is executed directly.
     """
-    app.run(threaded=False)
+    app.run(threaded=True, port=int(os.environ.get("MOCK_PORT", 5000)))
@@ -0,0 +1,88 @@
+"""
+Benchmark of the dependency graph validation on a large synthetic catalog.
+
+Usage:
+    python benchmarks/bench_graph.py [--resources 1000000] [--edges 5000000] [--seed 0] [--shape {random,diamond-ladder}]
+
+The diamond-ladder shape has levels of two resources, each depending on both resources of the level
+below, so the number of dependency paths doubles with every level (--edges is ignored).
+"""
+import sys
+import json
+import time
+import random
+import resource
+from pathlib import Path
+from argparse import ArgumentParser
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph import DependencyGraph
+from model import Resource
+
+
+def generate_resources(count: int, edges: int, seed: int) -> list[Resource]:
+    """
+    Generates resources forming a DAG: each resource depends only on resources generated before it.
+    """
+    rng = random.Random(seed)
+    ids = [f"resource_{i}" for i in range(count)]
+    per_resource = edges / max(count - 1, 1)
+    resources = []
+    for i in range(count):
+        dep_count = int(per_resource) + (rng.random() < per_resource % 1) if i else 0
+        deps = tuple(ids[rng.randrange(i)] for _ in range(dep_count))
+        resources.append(Resource(ids[i], "EntryGroup", deps))
+    return resources
+
+
+def generate_diamond_ladder(count: int) -> list[Resource]:
+    """
+    Generates levels of two resources, each depending on both resources of the previous level.
+    """
+    ids = [f"resource_{i}" for i in range(count)]
+    return [
+        Resource(ids[i], "EntryGroup", tuple(ids[(i // 2 - 1) * 2 : i // 2 * 2]))
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = ArgumentParser(description="Dependency graph validation benchmark")
+    parser.add_argument("--resources", type=int, default=1_000_000)
+    parser.add_argument("--edges", type=int, default=5_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shape", choices=["random", "diamond-ladder"], default="random")
+    args = parser.parse_args()
+
+    if args.shape == "diamond-ladder":
+        resources = generate_diamond_ladder(args.resources)
+    else:
+        resources = generate_resources(args.resources, args.edges, args.seed)
+
+    started = time.perf_counter()
+    graph = DependencyGraph.from_resources(resources)
+    built = time.perf_counter()
+    result = graph.validate()
+    validated = time.perf_counter()
+    # Every resource is valid, and its priority has to be computed however many paths reach it
+    assert sum(map(len, result.layers)) == len(resources), "valid resources are missing from the layers"
+
+    print(
+        json.dumps(
+            {
+                "resources": len(resources),
+                "edges": len(graph.deps),
+                "layers": len(result.layers),
+                "build_seconds": round(built - started, 3),
+                "validate_seconds": round(validated - built, 3),
+                "total_seconds": round(validated - started, 3),
+                # ru_maxrss is reported in kilobytes on Linux
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+End-to-end benchmark of the transfer path on a synthetic catalog.
+
+It times duplicate detection, deduplication and dependency validation of a generated catalog,
+then serves the catalog from the API mock (with a shortened transfer delay), fetches it and
+transfers it. The report is printed as JSON.
+
+Usage:
+    python benchmarks/bench_transfer.py --size 2000 --depth 5 --transfer-delay 0.5 [--mock-profile flaky] [--output report.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from argparse import ArgumentParser
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog_generator import add_generator_arguments, generate_catalog_from_args
+from transfer import find_duplicates, deduplicate_resources, validate_dependencies, fetch_resources, run_transfer
+from utils import parse_cli_args
+from model import resources_from_records
+
+
+def percentile(values: list[float], share: float) -> float | None:
+    """
+    Returns the nearest-rank percentile of the values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def timed_stage(report: dict, name: str, count: int, function, *args):
+    """
+    Runs the function, recording its duration and throughput in the report.
+    """
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    report["stages"][name] = {
+        "seconds": round(elapsed, 4),
+        "resources_per_second": round(count / elapsed, 1) if elapsed else None,
+    }
+    return result
+
+
+def free_port() -> int:
+    """
+    Returns a TCP port which is free at the moment.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(catalog_path: str, transfer_delay: float, port: int, profile: str = "default") -> subprocess.Popen:
+    """
+    Starts the API mock serving the catalog with the given profile and waits until it accepts connections.
+    """
+    env = dict(
+        os.environ,
+        DATA_CATALOG_MOCK_DATA=catalog_path,
+        DATAPLEX_TRANSFER_DELAY=str(transfer_delay),
+        MOCK_PROFILE=profile,
+        MOCK_PORT=str(port),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=ROOT / "api_mock",
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("API mock did not start.")
+
+
+def main():
+    parser = ArgumentParser(description="End-to-end transfer benchmark")
+    add_generator_arguments(parser)
+    parser.add_argument("--transfer-delay", type=float, default=0.5, help="Seconds it takes the mock to finish a transfer.")
+    parser.add_argument(
+        "--mock-profile", default="default",
+        help="Profile of the mock: a built-in one (realistic, flaky, overloaded, slow-network) or a JSON file.",
+    )
+    parser.add_argument("--skip-transfer", action="store_true", help="Only benchmark the offline stages.")
+    parser.add_argument("--output", help="Path of the JSON report, printed to stdout if not given.")
+    args, transfer_argv = parser.parse_known_args()
+
+    report = {"parameters": vars(args), "stages": {}}
+    records = generate_catalog_from_args(args)
+    report["resources"] = len(records)
+    # Deduplication works in place, the mock serves the catalog as generated
+    catalog = json.dumps(records)
+    resources = resources_from_records(records)
+    del records
+
+    duplicates = timed_stage(report, "find_duplicates", len(resources), find_duplicates, resources)
+    timed_stage(report, "deduplicate_resources", len(resources), deduplicate_resources, resources, duplicates)
+    layers, graph = timed_stage(report, "validate_dependencies", len(resources), validate_dependencies, resources)
+    valid_resources = {r.id: r for layer in layers for r in layer}
+    report["valid_resources"] = len(valid_resources)
+
+    if not args.skip_transfer:
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog_path = os.path.join(tmp, "catalog.json")
+            with open(catalog_path, "w", encoding="utf-8") as file:
+                file.write(catalog)
+
+            port = free_port()
+            transfer_args = parse_cli_args(
+                ["--api-url", f"http://127.0.0.1:{port}/", "--journal", os.path.join(tmp, "journal")]
+                + transfer_argv
+            )
+            # The mock runs in its own directory, so a profile file is passed by absolute path
+            profile = os.path.abspath(args.mock_profile) if os.path.isfile(args.mock_profile) else args.mock_profile
+            mock = start_mock(catalog_path, args.transfer_delay, port, profile)
+            try:
+                fetched = timed_stage(
+                    report, "fetch", len(resources), asyncio.run,
+                    fetch_resources(transfer_args.api_url, transfer_args.page_size),
+                )
+                report["fetched_resources"] = len(fetched)
+                transferred, latencies, error = timed_stage(
+                    report, "transfer", len(valid_resources), run_transfer,
+                    valid_resources, graph, transfer_args,
+                )
+                report["mock_stats"] = httpx.get(f"http://127.0.0.1:{port}/admin/stats").json()
+            finally:
+                mock.terminate()
+                mock.wait()
+
+        latencies = list(latencies.values())
+        report["transferred_resources"] = len(transferred)
+        report["transfer_error"] = error
+        report["latency_seconds"] = {
+            name: round(value, 4) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", max(latencies, default=None)),
+            )
+        }
+
+    # ru_maxrss is reported in kilobytes on Linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Generator of synthetic Data Catalog resources for benchmarks and load tests.
+
+Usage:
+    python benchmarks/catalog_generator.py --size 10000 --depth 5 --fan-out 2 --output catalog.json
+"""
+import json
+import random
+from argparse import ArgumentParser
+
+RESOURCE_TYPES = ("EntryGroup", "TagTemplate")
+
+
+def generate_catalog(
+    size: int,
+    depth: int = 5,
+    fan_out: float = 2.0,
+    duplicate_rate: float = 0.0,
+    missing_rate: float = 0.0,
+    cycle_rate: float = 0.0,
+    standalone_rate: float = 0.0,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Generates resources spread evenly over depth levels, each resource (except the first level)
+    depending on fan_out resources (on average) of lower levels, at least one of them on the level
+    right below. On top of that:
+    - standalone_rate of the resources are left out of the levels, with no dependencies and no
+      dependents, which skews the catalog towards short chains,
+    - missing_rate of the dependencies refer to resources which do not exist,
+    - cycle_rate of the resources get their first dependency depending back on them,
+    - duplicate_rate of the resources get a copy with the same id.
+    Resources are returned shuffled, the same seed always gives the same catalog.
+    """
+    rng = random.Random(seed)
+    leveled = size - int(standalone_rate * size)
+    depth = max(1, min(depth, leveled))
+    levels = [[] for _ in range(depth)]
+    resources = []
+
+    for i in range(size):
+        level = i * depth // leveled if i < leveled else None
+        resource_type = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+        resource_id = f"{resource_type.lower()}_{i}"
+
+        dependencies = []
+        if level:
+            count = max(1, int(fan_out) + (rng.random() < fan_out % 1))
+            for k in range(count):
+                if rng.random() < missing_rate:
+                    dependencies.append(f"missing_{i}_{k}")
+                    continue
+                source_level = level - 1 if k == 0 else rng.randrange(level)
+                dependencies.append(rng.choice(levels[source_level]))
+
+        resources.append(
+            {"id": resource_id, "type": resource_type, "dependencies": list(dict.fromkeys(dependencies))}
+        )
+        if level is not None:
+            levels[level].append(resource_id)
+
+    by_id = {resource["id"]: resource for resource in resources}
+    dependents = [r for r in resources if r["dependencies"] and r["dependencies"][0] in by_id]
+    for resource in rng.sample(dependents, min(len(dependents), int(cycle_rate * size))):
+        by_id[resource["dependencies"][0]]["dependencies"].append(resource["id"])
+
+    for _ in range(int(duplicate_rate * size)):
+        resources.append(json.loads(json.dumps(rng.choice(resources))))
+
+    rng.shuffle(resources)
+    return resources
+
+
+def add_generator_arguments(parser: ArgumentParser):
+    """
+    Adds catalog shape arguments to the parser.
+    """
+    parser.add_argument("--size", type=int, default=10000, help="Number of resources.")
+    parser.add_argument("--depth", type=int, default=5, help="Number of dependency levels.")
+    parser.add_argument("--fan-out", type=float, default=2.0, help="Average number of dependencies per resource.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Share of resources with a duplicate id.")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Share of dependencies which do not exist.")
+    parser.add_argument("--cycle-rate", type=float, default=0.0, help="Share of resources forming a cycle.")
+    parser.add_argument("--standalone-rate", type=float, default=0.0, help="Share of resources without dependencies and dependents.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+
+
+def generate_catalog_from_args(args) -> list[dict]:
+    """
+    Generates a catalog shaped by the arguments added with add_generator_arguments.
+    """
+    return generate_catalog(
+        args.size,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        duplicate_rate=args.duplicate_rate,
+        missing_rate=args.missing_rate,
+        cycle_rate=args.cycle_rate,
+        standalone_rate=args.standalone_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = ArgumentParser(description="Synthetic Data Catalog generator")
+    add_generator_arguments(parser)
+    parser.add_argument("--output", required=True, help="Path of the JSON file to write.")
+    args = parser.parse_args()
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(generate_catalog_from_args(args), file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Differential check of the dependency graph validation against the original validate_dependencies,
+on random catalogs with missing dependencies and cycles, and of the transfer priorities against
+dependents counted by brute force.
+
+Usage:
+    python benchmarks/check_graph.py [--catalogs 200] [--resources 300] [--seed 0]
+"""
+import sys
+import random
+from pathlib import Path
+from argparse import ArgumentParser
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph import DOWNSTREAM_SKETCH_SIZE, DependencyGraph
+from model import Resource
+from bench_graph import generate_diamond_ladder
+
+
+def reference_validation(resources: list[dict]) -> tuple[list[set], set, set]:
+    """
+    Validates the resources as the original validate_dependencies of transfer.py did.
+    Returns ids of the layers, of the missing resources and of the resources left in or behind cycles.
+    """
+    collector, ref_lookup = {}, {}
+    for resource in resources:
+        collector[resource["id"]] = resource
+        if resource["id"] not in ref_lookup:
+            ref_lookup[resource["id"]] = {"outbound": 0, "backrefs": []}
+        for dep in resource["dependencies"]:
+            if dep not in ref_lookup:
+                ref_lookup[dep] = {"outbound": 0, "backrefs": []}
+            ref_lookup[dep]["backrefs"].append(resource["id"])
+            ref_lookup[resource["id"]]["outbound"] += 1
+
+    missing_dependencies, layer, visited = set(), set(), set()
+    for id in ref_lookup:
+        if ref_lookup[id]["outbound"] == 0:
+            layer.add(id)
+        if id not in collector:
+            missing_dependencies.add(id)
+
+    layer_log = []
+    while len(layer) > 0:
+        next_layer = set()
+        for resource_id in layer:
+            for backref in ref_lookup[resource_id]["backrefs"]:
+                if resource_id in missing_dependencies:
+                    missing_dependencies.add(backref)
+                ref_lookup[backref]["outbound"] -= 1
+                if ref_lookup[backref]["outbound"] == 0:
+                    next_layer.add(backref)
+            if resource_id in collector:
+                visited.add(resource_id)
+        layer_log.append(visited.intersection(layer) - missing_dependencies)
+        layer = next_layer
+
+    return layer_log, missing_dependencies, set(collector) - visited - missing_dependencies
+
+
+def generate_catalog(rng: random.Random, count: int) -> list[Resource]:
+    """
+    Generates resources depending mostly on resources generated before them, with some
+    dependencies on later resources (forming cycles) and on resources which do not exist.
+    """
+    resources = []
+    for i in range(count):
+        deps = []
+        for _ in range(rng.randrange(4)):
+            roll = rng.random()
+            if roll < 0.03:
+                deps.append(f"missing_{rng.randrange(count)}")
+            elif roll < 0.06 or not i:
+                deps.append(f"resource_{rng.randrange(count)}")
+            else:
+                deps.append(f"resource_{rng.randrange(i)}")
+        resources.append(Resource(f"resource_{i}", "EntryGroup", tuple(deps)))
+    return resources
+
+
+def check_validation(resources: list[Resource]):
+    """
+    Checks that the graph orders the resources into the same layers and reports the same missing
+    resources and cycles as the original validation.
+    """
+    graph = DependencyGraph.from_resources(resources)
+    result = graph.validate()
+    layers, missing, cyclic = reference_validation(
+        [{"id": r.id, "dependencies": list(r.dependencies)} for r in resources]
+    )
+    ids = graph.ids
+    assert [{ids[node] for node in layer} for layer in result.layers] == layers, "layers differ"
+    assert {ids[node] for node in result.missing} == missing, "missing resources differ"
+    assert {ids[node] for node in result.cycle_members + result.blocked_by_cycles} == cyclic, "cycles differ"
+    assert not set(result.cycle_members) & set(result.missing), "cycle members are reported as missing"
+
+
+def check_priorities(resources: list[Resource]):
+    """
+    Checks the downstream depth and count of every ordered resource of a DAG against its dependents
+    found by brute force: counts below the sketch size have to be exact, larger ones close.
+    """
+    graph = DependencyGraph.from_resources(resources)
+    result = graph.validate()
+    for layer in result.layers:
+        for node in layer:
+            dependents, depth, frontier = set(), 0, {node}
+            while frontier:
+                frontier = {d for n in frontier for d in graph.dependents_of(n)}
+                dependents |= frontier
+                depth += bool(frontier)
+            count = graph.downstream_count[node]
+            assert graph.downstream_depth[node] == depth, f"downstream depth of {graph.ids[node]} differs"
+            if len(dependents) < DOWNSTREAM_SKETCH_SIZE:
+                assert count == len(dependents), f"downstream count of {graph.ids[node]} differs"
+            else:
+                error = abs(count - len(dependents)) / len(dependents)
+                assert error <= 0.5, f"downstream count of {graph.ids[node]} is off by {error:.0%}"
+
+
+def main():
+    parser = ArgumentParser(description="Dependency graph validation check")
+    parser.add_argument("--catalogs", type=int, default=200)
+    parser.add_argument("--resources", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for _ in range(args.catalogs):
+        check_validation(generate_catalog(rng, rng.randrange(1, args.resources)))
+
+    # Every resource of a diamond ladder is reached by a number of paths doubling with every level,
+    # but has to count each of the resources depending on it once
+    ladder = generate_diamond_ladder(DOWNSTREAM_SKETCH_SIZE)
+    check_priorities(ladder)
+    graph = DependencyGraph.from_resources(ladder)
+    graph.validate()
+    assert graph.downstream_count[0] == len(ladder) - 2, "dependents of the diamond ladder are not distinct"
+    check_priorities(generate_diamond_ladder(160))
+
+    print(f"{args.catalogs} catalogs and the diamond ladders checked")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import sys
+import mmap
+import struct
+import asyncio
+from exceptions import DataException
+from model import Resource, loads
+
+# Export files with one JSON record per line, any other export is in the binary format
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+
+# The binary format starts with the magic, followed by entries each starting with its tag:
+#   STRING:   u32 length, UTF-8 bytes; the string gets the next index, starting from 0
+#   RESOURCE: u32 id index, u32 type index, u32 dependency count, u32 index of every dependency,
+#             u32 record length, the record serialized as JSON (empty if it has no other fields)
+#   END:      u64 number of resources, which tells a complete export from a truncated one
+# Every string is written once, before the first resource using it. Integers are little-endian.
+MAGIC = b"DCEXPORT\x01"
+_END, _STRING, _RESOURCE = 0, 1, 2
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_RESOURCE_HEADER = struct.Struct("<III")
+
+
+def is_json_lines(path: str) -> bool:
+    """
+    Returns whether the export is in JSON Lines, otherwise it is in the binary format.
+    """
+    return path.endswith(JSON_LINES_SUFFIXES)
+
+
+class CatalogExportSource:
+    """
+    Reads resources from a catalog export file instead of the Data Catalog API, with the same
+    iter_pages interface as DataCatalogClient. The file is memory-mapped and parsed page by page
+    as the pages are consumed, so only the resources are kept in memory, not the file.
+
+    Records of JSON Lines exports are validated like the ones of Data Catalog pages. Binary exports
+    (see CatalogExportWriter) hold resources validated when they were written, which are built
+    without parsing any JSON.
+    """
+    def __init__(self, path: str, page_size: int = 1000):
+        self._path = path
+        self._page_size = page_size
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Nothing to close, the file is open only while its pages are iterated.
+        """
+
+    async def iter_pages(self):
+        """
+        Yields pages of resources of the export, in the order they were written.
+        """
+        try:
+            with open(self._path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except OSError as e:
+            raise DataException(f"Unable to read catalog export '{self._path}': {e}") from e
+
+        try:
+            parse = self._parse_json_lines if is_json_lines(self._path) else self._parse_binary
+            page = []
+            for resource in parse(data):
+                page.append(resource)
+                if len(page) == self._page_size:
+                    yield page
+                    page = []
+                    # Let the transfer progress between pages
+                    await asyncio.sleep(0)
+            if page:
+                yield page
+        finally:
+            if size:
+                data.close()
+
+    def _parse_json_lines(self, data):
+        """
+        Yields the resources of a JSON Lines export.
+        """
+        start, line_number = 0, 0
+        while start < len(data):
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = len(data)
+            line_number += 1
+            line = data[start:end]
+            start = end + 1
+            if line.isspace() or not line:
+                continue
+            try:
+                record = loads(line)
+            except ValueError as e:
+                raise DataException(f"Invalid JSON on line {line_number} of catalog export '{self._path}'.") from e
+            yield Resource.from_record(record)
+
+    def _parse_binary(self, data):
+        """
+        Yields the resources of a binary export.
+        """
+        if data[: len(MAGIC)] != MAGIC:
+            raise DataException(f"'{self._path}' is not a catalog export.")
+        strings, count, position = [], 0, len(MAGIC)
+        intern = sys.intern
+        try:
+            while True:
+                tag = data[position]
+                position += 1
+                if tag == _RESOURCE:
+                    id, type, dependency_count = _RESOURCE_HEADER.unpack_from(data, position)
+                    position += _RESOURCE_HEADER.size
+                    dependencies = struct.unpack_from(f"<{dependency_count}I", data, position)
+                    position += 4 * dependency_count
+                    (length,) = _U32.unpack_from(data, position)
+                    position += _U32.size
+                    if position + length > len(data):
+                        raise IndexError("record out of the file")
+                    record = data[position : position + length] if length else None
+                    position += length
+                    count += 1
+                    yield Resource(strings[id], strings[type], tuple([strings[d] for d in dependencies]), record)
+                elif tag == _STRING:
+                    (length,) = _U32.unpack_from(data, position)
+                    position += _U32.size
+                    if position + length > len(data):
+                        raise IndexError("string out of the file")
+                    strings.append(intern(str(data[position : position + length], "utf-8")))
+                    position += length
+                elif tag == _END:
+                    (expected,) = _U64.unpack_from(data, position)
+                    if expected != count:
+                        raise DataException(
+                            f"Catalog export '{self._path}' has {count} resources instead of {expected}."
+                        )
+                    return
+                else:
+                    raise DataException(f"Corrupted catalog export '{self._path}' at byte {position - 1}.")
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise DataException(f"Corrupted or truncated catalog export '{self._path}': {e}") from e
+
+
+class CatalogExportWriter:
+    """
+    Writes resources into a catalog export, in JSON Lines if the path ends with .jsonl or .ndjson,
+    otherwise in the binary format. Resources are written as they are given, the file replaces
+    the previous export atomically once it is complete, and is discarded if writing fails.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._json_lines = is_json_lines(path)
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            self._file = open(self._tmp_path, "wb")
+        except OSError as e:
+            raise DataException(f"Unable to write catalog export '{path}': {e}") from e
+        self._strings = {}
+        if not self._json_lines:
+            self._file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _string(self, value: str) -> int:
+        """
+        Returns the index of the string, writing it first if it is new.
+        """
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+            encoded = value.encode()
+            self._file.write(bytes((_STRING,)) + _U32.pack(len(encoded)) + encoded)
+        return index
+
+    def write(self, resources):
+        """
+        Writes the resources.
+        """
+        write = self._file.write
+        if self._json_lines:
+            for resource in resources:
+                write(resource.encode() + b"\n")
+                self.count += 1
+            return
+        for resource in resources:
+            indices = [self._string(resource.id), self._string(resource.type)]
+            indices.extend(self._string(dependency) for dependency in resource.dependencies)
+            record = resource.record or b""
+            write(
+                bytes((_RESOURCE,))
+                + _RESOURCE_HEADER.pack(indices[0], indices[1], len(indices) - 2)
+                + struct.pack(f"<{len(indices) - 2}I", *indices[2:])
+                + _U32.pack(len(record))
+                + record
+            )
+            self.count += 1
+
+    def close(self):
+        """
+        Completes the export and replaces the previous one.
+        """
+        if not self._json_lines:
+            self._file.write(bytes((_END,)) + _U64.pack(self.count))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        """
+        Removes the incomplete export, keeping the previous one.
+        """
+        self._file.close()
+        os.remove(self._tmp_path)
@@ -1,29 +1,77 @@
-import json
+import sys
+import time
+import asyncio
 import httpx
 from exceptions import NetworkingException, DataException, ApiClientException
+from metrics import metrics, endpoint_label
+from client.http_cache import HttpCache
+from model import Resource, loads
+
+RESOURCE_TYPES = ("EntryGroup", "TagTemplate")
+# Version of the cached pages, cache entries of other versions are never read
+CACHE_FORMAT = 3
 
 
 class DataCatalogClient:
     """
     A client for interacting with the data catalog service. It provides methods to retrieve entry groups
-    and tag templates from the service endpoint.
+    and tag templates from the service endpoint, page by page.
     """
-    def __init__(self, service_endpoint: str):
+    def __init__(self, service_endpoint: str, page_size: int = 1000, cache: HttpCache | None = None):
         """
         Initializes the DataCatalogClient with the given service endpoint.
+        With a cache, pages are requested conditionally and unchanged pages are taken from the cache.
+        """
+        self._client = httpx.AsyncClient(base_url=service_endpoint)
+        self._page_size = page_size
+        self._cache = cache
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Closes the underlying HTTP client.
         """
-        self._client = httpx.Client(base_url=service_endpoint)
+        await self._client.aclose()
 
-    def _perform_request(self, method, path, payload=None):
+    async def _send(self, method, path, payload=None, params=None, headers=None) -> httpx.Response:
+        """
+        Sends an HTTP request to the data catalog service.
+        """
+        endpoint = endpoint_label(method, path)
+        with metrics.in_flight("requests_in_flight", api="data_catalog"):
+            started = time.perf_counter()
+            try:
+                response = await self._client.request(
+                    method=method, url=path, json=payload, params=params, headers=headers
+                )
+            except httpx.HTTPError as e:
+                metrics.error("request", e)
+                raise
+        metrics.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+        metrics.inc("http_requests_total", endpoint=endpoint, status=response.status_code)
+        return response
+
+    async def _perform_request(self, method, path, payload=None, params=None, headers=None):
         """
         Sends an HTTP request to the data catalog service and returns the parsed JSON response.
         """
-        response = self._client.request(method=method, url=path, json=payload)
+        response = await self._send(method, path, payload, params, headers)
+        return self._parse_response(response)
 
+    @staticmethod
+    def _parse_response(response: httpx.Response):
+        """
+        Returns the parsed JSON response.
+        """
         result = None
         try:
-            result = response.json()
-        except json.JSONDecodeError as e:
+            result = loads(response.content)
+        except ValueError as e:
             raise NetworkingException("Could not retrieve resources.") from e
 
         if response.is_error:  # but response json was parsed successfully
@@ -31,30 +79,152 @@ class DataCatalogClient:
 
         return result
 
-    def _validate_resource(self, data: dict):
+    def _validate_resource(self, data: list[dict]) -> list[Resource]:
         """
-        Validates that each resource in the data has an id and a type.
+        Validates that each resource in the data has an id and a type, and builds the resources.
         """
-        for record in data:
-            if "id" not in record:
-                raise DataException("Resource ID not found.")
-            if "type" not in record:
-                raise DataException("Resource type not found")
+        return [Resource.from_record(record) for record in data]
 
-    def get_entry_groups(self) -> list[dict]:
+    async def _get_page(self, path: str, params: dict) -> dict:
         """
-        Retrieves a list of entry groups from the data catalog.
+        Retrieves a validated page. With a cache, the request is made conditional on the validators
+        of the cached page, which is reused without parsing anything if the server has not changed it.
         """
-        data = self._perform_request("GET", "/data_catalog/EntryGroup")
-        self._validate_resource(data)
+        if self._cache is None:
+            return self._validate_page(await self._perform_request("GET", path, params=params))
+
+        key = f"{CACHE_FORMAT}:{self._client.base_url.join(path).copy_merge_params(params)}"
+        cached = self._cache.get(key)
+        headers = {}
+        if cached is not None:
+            validators = cached[0]
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        response = await self._send("GET", path, params=params, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            metrics.inc("http_cache_hits_total")
+            return self._page_from_cache(cached[1])
 
+        metrics.inc("http_cache_misses_total")
+        data = self._validate_page(self._parse_response(response))
+        validators = {}
+        if "ETag" in response.headers:
+            validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validators["last_modified"] = response.headers["Last-Modified"]
+        if validators:
+            self._cache.put(key, validators, self._page_to_cache(data))
         return data
 
-    def get_tag_templates(self) -> list[dict]:
+    @staticmethod
+    def _page_to_cache(page: dict) -> dict:
         """
-        Retrieves a list of tag templates from the data catalog.
+        Returns the validated page in a JSON-serializable form, with every resource as a list of
+        its id, type, dependencies and serialized record.
         """
-        data = self._perform_request("GET", "/data_catalog/TagTemplate")
-        self._validate_resource(data)
+        return {
+            **page,
+            "resources": [
+                [r.id, r.type, r.dependencies, None if r.record is None else r.record.decode()]
+                for r in page["resources"]
+            ],
+        }
 
-        return data
+    @staticmethod
+    def _page_from_cache(page: dict) -> dict:
+        """
+        Rebuilds a page stored by _page_to_cache. It was validated before it was stored.
+        """
+        intern = sys.intern
+        return {
+            **page,
+            "resources": [
+                Resource(
+                    intern(id), intern(type), tuple(map(intern, deps)), None if record is None else record.encode()
+                )
+                for id, type, deps, record in page["resources"]
+            ],
+        }
+
+    def _validate_page(self, data) -> dict:
+        """
+        Validates that the page has the expected format and all its resources have an id and a type.
+        Returns the page with the resources built of its records.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("resources"), list):
+            raise DataException("Unexpected page format.")
+        return {**data, "resources": self._validate_resource(data["resources"])}
+
+    async def iter_resource_pages(self, resource_type: str):
+        """
+        Yields validated pages of resources of the given type, following the page tokens.
+        """
+        page_token = None
+        while True:
+            params = {"pageSize": self._page_size}
+            if page_token:
+                params["pageToken"] = page_token
+
+            data = await self._get_page(f"/data_catalog/{resource_type}", params)
+            yield data["resources"]
+
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def iter_pages(self, resource_types=RESOURCE_TYPES):
+        """
+        Yields validated pages of resources of all the given types as soon as they arrive.
+        Types are fetched concurrently, each of them fetching at most one page ahead of the consumer.
+        """
+        queue = asyncio.Queue(maxsize=len(resource_types))
+        done = object()
+
+        async def produce(resource_type):
+            try:
+                async for page in self.iter_resource_pages(resource_type):
+                    await queue.put(page)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(done)
+
+        producers = [asyncio.create_task(produce(t)) for t in resource_types]
+        try:
+            remaining = len(producers)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for producer in producers:
+                producer.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+    async def _get_all(self, resource_type: str) -> list[Resource]:
+        """
+        Retrieves all the resources of the given type.
+        """
+        resources = []
+        async for page in self.iter_resource_pages(resource_type):
+            resources.extend(page)
+        return resources
+
+    async def get_entry_groups(self) -> list[Resource]:
+        """
+        Retrieves a list of entry groups from the data catalog.
+        """
+        return await self._get_all("EntryGroup")
+
+    async def get_tag_templates(self) -> list[Resource]:
+        """
+        Retrieves a list of tag templates from the data catalog.
+        """
+        return await self._get_all("TagTemplate")
@@ -1,107 +1,289 @@
-import json
+import time
 import asyncio
+import itertools
 import httpx
-from exceptions import ApiClientException, DataException
+from exceptions import ApiClientException, DataException, NetworkingException
+from metrics import metrics, endpoint_label
+from client.rate_control import AimdLimiter, CircuitBreaker, backoff_delay
+from model import Resource, dumps, loads
+
+# Responses of an overloaded server, the request was not processed and can always be retried
+OVERLOAD_STATUSES = (429, 503)
+# Errors raised before the request was sent, so it can always be retried
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Seconds without any data, keep-alives included, after which a watch connection is considered broken
+WATCH_READ_TIMEOUT = 30.0
 
 
 class DataplexCatalogClient:
     """
     A client for interacting with the Dataplex catalog service. It provides methods to initiate resource
-    transfers (e.g., entry groups, tag templates) and poll for transfer completion.
+    transfers in batches, get their statuses and watch for finished transfers.
     """
-    def __init__(self, service_endpoint: str):
+    def __init__(
+        self,
+        service_endpoint: str,
+        max_connections: int = 100,
+        max_in_flight: int = 50,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        batch_size: int = 100,
+        max_retries: int = 5,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
         """
         Initializes the DataplexCatalogClient with the given service endpoint.
+
+        A single client is meant to be shared by the whole run: it keeps one pooled connection set
+        (at most max_connections sockets, all of them kept alive between requests) and allows no
+        more than max_in_flight requests to be sent at the same time. The in-flight limit shrinks while
+        the server is overloaded and grows back while its responses are healthy.
+        HTTP/2 support requires the optional "h2" package (pip install httpx[http2]).
+        Bulk methods send at most batch_size resources (or ids) per request.
+        Failed requests which are safe to repeat are retried up to max_retries times, with jittered
+        exponential backoff starting at retry_delay seconds.
         """
-        self._client = httpx.AsyncClient(base_url=service_endpoint + "dataplex_catalog")
-        self._delay = 2
-        self._retries = 5
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client = httpx.AsyncClient(
+            base_url=service_endpoint + "dataplex_catalog", limits=limits, http2=http2
+        )
+        self._limiter = AimdLimiter(max_in_flight)
+        self._breaker = CircuitBreaker()
+        self.batch_size = batch_size
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
 
-    async def _initiate_resource_transfer(self, url, resource):
+    async def aclose(self):
         """
-        Initiates a resource transfer by sending a POST request with the provided resource data.
+        Closes the underlying HTTP client and all of its pooled connections.
         """
-        response = await self._client.post(url, json=resource)
+        await self._client.aclose()
+
+    async def _request(self, method, url, idempotent=True, **kwargs):
+        """
+        Sends a request, waiting for the circuit breaker and a free in-flight slot first.
+
+        Responses of an overloaded server (429, 503) and errors raised before sending the request
+        are always retried. Other server errors and network failures are retried only if the
+        request is idempotent, since the server may have processed it already. The response of
+        the last attempt is returned if all of them fail. Raises NetworkingException if no
+        response was received.
+        """
+        endpoint = endpoint_label(method, "/dataplex_catalog" + url)
+        for attempt in range(self._max_retries + 1):
+            probe = await self._breaker.wait()
+            started_at, response, error = None, None, None
+            try:
+                started_at = await self._limiter.acquire()
+                with metrics.in_flight("requests_in_flight", api="dataplex_catalog"):
+                    started = time.perf_counter()
+                    try:
+                        response = await self._client.request(method, url, **kwargs)
+                    except httpx.TransportError as e:
+                        metrics.error("request", e)
+                        error = e
+                    except httpx.HTTPError as e:
+                        metrics.error("request", e)
+                        raise NetworkingException(f"Request {endpoint} failed: {e!r}") from e
+            except BaseException:
+                # Cancelled or failed without an outcome: the slot is freed even if cancelled again,
+                # and another request may probe the server
+                if probe:
+                    self._breaker.cancel_probe()
+                if started_at is not None:
+                    await asyncio.shield(self._limiter.release(started_at, overloaded=False))
+                raise
+
+            if error is None:
+                metrics.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+                metrics.inc("http_requests_total", endpoint=endpoint, status=response.status_code)
+                overloaded = response.status_code in OVERLOAD_STATUSES
+                failed = overloaded or response.is_server_error
+                retryable = overloaded or (failed and idempotent)
+            else:
+                overloaded = failed = True
+                retryable = idempotent or isinstance(error, UNSENT_ERRORS)
+
+            if failed:
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+            await asyncio.shield(self._limiter.release(started_at, overloaded))
+
+            if not retryable or attempt == self._max_retries:
+                if error is not None:
+                    raise NetworkingException(f"Request {endpoint} failed: {error!r}") from error
+                return response
+
+            reason = type(error).__name__ if error is not None else str(response.status_code)
+            metrics.inc("http_retries_total", endpoint=endpoint, reason=reason)
+            await asyncio.sleep(self._retry_after(response, attempt))
+
+    def _retry_after(self, response: httpx.Response | None, attempt: int) -> float:
+        """
+        Returns the delay before retrying a failed request, as requested by the server's Retry-After
+        header if there is one.
+        """
+        if response is not None:
+            try:
+                return min(self._max_retry_delay, float(response.headers["Retry-After"]))
+            except (KeyError, ValueError):
+                pass
+        return backoff_delay(attempt, self._retry_delay, self._max_retry_delay)
+
+    async def _perform_bulk_request(self, url, payload, idempotent=True):
+        """
+        Sends a bulk POST request and returns its decoded response.
+        The payload is either a JSON-serializable value or already serialized JSON.
+        Raises ApiClientException if the response is not a JSON object.
+        """
+        content = payload if isinstance(payload, bytes) else dumps(payload)
+        response = await self._request(
+            "POST", url, idempotent=idempotent, content=content, headers={"Content-Type": "application/json"}
+        )
 
         result = None
         try:
-            result = response.json()
-        except json.JSONDecodeError as e:
+            result = loads(response.content)
+        except ValueError as e:
             raise ApiClientException("Unable to decode response") from e
+        if not isinstance(result, dict):
+            raise ApiClientException(f"Unexpected response to bulk request to {url}")
 
         if response.is_client_error:
-            raise DataException(
-                f'Error "{result["error"]}" when initiating {resource["type"]} "{resource["id"]}" transfer'
-            )
+            raise DataException(f'Error "{result.get("error")}" when sending bulk request to {url}')
         if response.is_error:
-            raise ApiClientException(
-                f"Server Error {result["error"]}."
-            )  # worth a retry probably
+            raise ApiClientException(f"Server Error {result.get("error")}.")
 
         return result
 
-    async def _poll_with_backoff(self, url):
+    def batched(self, items):
         """
-        Polls the server for the completion of a resource transfer with exponential backoff.
+        Groups resources (or resource ids) into batches of at most batch_size items.
         """
-        i = 0
-        timeout = self._delay
+        return [list(batch) for batch in itertools.batched(items, self.batch_size)]
 
-        while i < self._retries:
-            response = await self._client.get(url)
+    async def initiate_batch_transfer(self, resources: list[Resource], replace: bool = False):
+        """
+        Initiates the transfer of a batch of resources with a single request.
+        With replace, resources already present in Dataplex are transferred again instead of rejected.
+        Raises DataException if any of the resources was rejected.
 
-            data = None
+        Without replace the request is not idempotent, so if it fails on the server's side, the
+        resources Dataplex already knows are considered accepted and only the rest is sent again.
+        """
+        results, remaining = [], resources
+        for attempt in range(self._max_retries + 1):
             try:
-                data = response.json()
-            except json.JSONDecodeError:
-                pass  # Don't want to break the loop in case it's a one-time occasion
-
-            if data and data["transfer_finished"]:
-                return True
+                # Records of the resources are sent as they were serialized when fetched
+                payload = (
+                    b'{"resources":['
+                    + b",".join(r.encode() for r in remaining)
+                    + (b'],"replace":true}' if replace else b'],"replace":false}')
+                )
+                result = await self._perform_bulk_request("/batch", payload, idempotent=replace)
+                break
+            except (ApiClientException, NetworkingException):
+                if replace or attempt == self._max_retries:
+                    raise
+            # The batch may have been (partially) accepted before the failure
+            known = await self.get_transfer_statuses([r.id for r in remaining])
+            results.extend({"id": r.id, "accepted": True} for r in remaining if r.id in known)
+            remaining = [r for r in remaining if r.id not in known]
+            if not remaining:
+                return results
+            metrics.inc("http_retries_total", endpoint="POST /dataplex_catalog/batch", reason="reconciled")
+            await asyncio.sleep(backoff_delay(attempt, self._retry_delay, self._max_retry_delay))
 
-            await asyncio.sleep(timeout)
-            i += 1
-            timeout *= 2
+        try:
+            rejected = [r for r in result["results"] if not r["accepted"]]
+        except (KeyError, TypeError) as e:
+            raise ApiClientException("Unexpected response to bulk request to /batch") from e
+        if rejected:
+            raise DataException(
+                "Error when initiating transfer: "
+                + ", ".join(f'"{r.get("id")}": "{r.get("error")}"' for r in rejected)
+            )
 
-        raise ApiClientException("Unable to validate resource transfer: timeout.")
+        return results + result["results"]
 
-    async def initiate_entrygroup_transfer(self, entry_group: dict):
+    async def get_transfer_statuses(self, resource_ids) -> dict[str, bool]:
         """
-        Initiates the transfer of an entry group resource.
+        Retrieves the transfer_finished flag for many resources, with one request per batch.
+        Resources unknown to Dataplex are left out of the result.
         """
-        return await self._initiate_resource_transfer(
-            f"/EntryGroup/{entry_group["id"]}", resource=entry_group
+        results = await asyncio.gather(
+            *[
+                self._perform_bulk_request("/status", {"ids": batch})
+                for batch in self.batched(resource_ids)
+            ]
         )
 
-    async def poll_for_entrygroup_transfer_completion(self, resource_id):
-        """
-        Polls for the completion of an entry group transfer.
-        """
-        return await self._poll_with_backoff(f"/EntryGroup/{resource_id}")
-
-    async def initiate_tag_template_transfer(self, tag_template: dict):
-        """
-        Initiates the transfer of a tag template resource.
-        """
-        return await self._initiate_resource_transfer(
-            f"/TagTemplate/{tag_template["id"]}", resource=tag_template
-        )
+        statuses = {}
+        try:
+            for result in results:
+                statuses.update(result["statuses"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ApiClientException("Unexpected response to bulk request to /status") from e
+        return statuses
 
-    async def poll_for_tag_template_transfer_completion(self, resource_id):
-        """
-        Polls for the completion of a tag template transfer.
+    async def watch_finished_transfers(self, cursor: str | None = None):
         """
-        return await self._poll_with_backoff(f"/TagTemplate/{resource_id}")
+        Subscribes to the stream of finished transfers, yielding (cursor, ids) of its events: no ids
+        once the subscription is established, then ids of transfers as they finish. Passing the last
+        cursor back resumes the stream after it.
 
-    def __del__(self):
+        The stream has a connection of its own, so that it does not take one from the pool or an
+        in-flight slot. Raises ApiClientException if the server does not offer the stream, and
+        NetworkingException when the connection fails or ends.
         """
-        Clean up and close the HTTP client when the DataplexCatalogClient is deleted.
+        headers = {"Accept": "text/event-stream"}
+        if cursor is not None:
+            headers["Last-Event-ID"] = cursor
+        timeout = httpx.Timeout(10.0, read=WATCH_READ_TIMEOUT)
+        try:
+            async with httpx.AsyncClient(base_url=self._client.base_url, timeout=timeout) as client:
+                async with client.stream("GET", "/watch", headers=headers) as response:
+                    if response.status_code != 200:
+                        raise ApiClientException(f"Unable to watch transfers: status {response.status_code}.")
+                    metrics.inc("watch_subscriptions_total")
+                    event, data = None, []
+                    async for line in response.aiter_lines():
+                        if line.startswith(":"):
+                            continue
+                        if line:
+                            field, _, value = line.partition(":")
+                            value = value.removeprefix(" ")
+                            if field == "event":
+                                event = value
+                            elif field == "data":
+                                data.append(value)
+                            elif field == "id":
+                                cursor = value
+                            continue
+                        # A blank line dispatches the event
+                        if event == "ready":
+                            yield cursor, []
+                        elif event == "finished":
+                            try:
+                                ids = loads("\n".join(data))["ids"]
+                            except (ValueError, KeyError, TypeError) as e:
+                                raise ApiClientException("Unable to decode transfer event") from e
+                            yield cursor, ids
+                        event, data = None, []
+        except httpx.HTTPError as e:
+            raise NetworkingException(f"Transfer watch failed: {e!r}") from e
+        raise NetworkingException("Transfer watch ended by the server.")
 
-        This ensures that the asynchronous client is properly closed, even if the event loop has finished running.
-        """
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            loop.create_task(self._client.aclose())
-        else:
-            # in case the event loop has already finished runnign we still want to cleanup properly
-            loop.run_until_complete(self._client.aclose())
@@ -0,0 +1,92 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from model import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".json"
+
+
+class HttpCache:
+    """
+    On-disk cache of validated response payloads together with their ETag and Last-Modified
+    validators, one JSON file per request: a header line with the key and the validators, then the
+    payload, which has to be JSON-serializable. Entries are evicted in least recently used order
+    once the total size of the cache exceeds max_bytes. Files are replaced atomically, so the
+    cache can be shared by concurrent runs.
+    """
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Opens the cache in the given directory, creating it if needed.
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Entry file names with their sizes, from the least to the most recently used
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._size = sum(self._entries.values())
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ENTRY_SUFFIX
+
+    def get(self, key: str) -> tuple[dict, object] | None:
+        """
+        Returns the validators and the payload stored for the key, or None if there are none.
+        """
+        name = self._file_name(key)
+        if name not in self._entries:
+            return None
+
+        path = os.path.join(self._directory, name)
+        try:
+            with open(path, "rb") as file:
+                header = loads(file.readline())
+                stored_key, validators = header["key"], header["validators"]
+                payload = loads(file.read())
+        except Exception as e:  # missing, truncated or incompatible entry, it is just a cache miss
+            logger.debug("Unable to read cache entry of '%s': %s", key, e)
+            self._forget(name)
+            return None
+        if stored_key != key:
+            return None
+
+        # Modification time of the file marks when it was used last
+        os.utime(path)
+        self._entries.move_to_end(name)
+        return validators, payload
+
+    def put(self, key: str, validators: dict, payload):
+        """
+        Stores the payload with its validators, evicting least recently used entries if needed.
+        """
+        name = self._file_name(key)
+        path = os.path.join(self._directory, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            # Compact JSON has no line breaks, so the header ends at the first one
+            file.write(dumps({"key": key, "validators": validators}) + b"\n")
+            file.write(dumps(payload))
+            size = file.tell()
+        os.replace(tmp_path, path)
+
+        self._size += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+        while self._size > self._max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+            try:
+                os.remove(os.path.join(self._directory, oldest))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name: str):
+        self._size -= self._entries.pop(name, 0)
@@ -0,0 +1,64 @@
+import os
+from client.http_cache import HttpCache
+from client.data_catalog import DataCatalogClient
+from client.dataplex_catalog import DataplexCatalogClient
+
+
+class ClientPool:
+    """
+    Clients of the Data Catalog and Dataplex APIs kept open across migrations, so that later
+    migrations reuse their warm connection pools, adapted in-flight limits and response caches.
+    A client is created on first use for every distinct configuration, and all of them must be
+    used from the event loop they were created in.
+    """
+    def __init__(self):
+        self._caches = {}
+        self._data_catalog_clients = {}
+        self._dataplex_clients = {}
+
+    def cache(self, args) -> HttpCache | None:
+        """
+        Returns the Data Catalog response cache configured by CLI args, None if it is disabled.
+        """
+        if args.no_cache:
+            return None
+        key = (os.path.abspath(args.cache_dir), args.cache_size)
+        if key not in self._caches:
+            self._caches[key] = HttpCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        return self._caches[key]
+
+    def data_catalog(self, args) -> DataCatalogClient:
+        """
+        Returns the Data Catalog client configured by CLI args.
+        """
+        cache = self.cache(args)
+        key = (args.api_url, args.page_size, id(cache))
+        if key not in self._data_catalog_clients:
+            self._data_catalog_clients[key] = DataCatalogClient(args.api_url, page_size=args.page_size, cache=cache)
+        return self._data_catalog_clients[key]
+
+    def dataplex(self, args) -> DataplexCatalogClient:
+        """
+        Returns the Dataplex client configured by CLI args.
+        """
+        key = (args.api_url, args.max_connections, args.max_in_flight, args.http2, args.batch_size, args.max_retries)
+        if key not in self._dataplex_clients:
+            self._dataplex_clients[key] = DataplexCatalogClient(
+                args.api_url,
+                max_connections=args.max_connections,
+                max_in_flight=args.max_in_flight,
+                http2=args.http2,
+                batch_size=args.batch_size,
+                max_retries=args.max_retries,
+            )
+        return self._dataplex_clients[key]
+
+    async def aclose(self):
+        """
+        Closes all the clients.
+        """
+        for client in [*self._data_catalog_clients.values(), *self._dataplex_clients.values()]:
+            await client.aclose()
+        self._data_catalog_clients.clear()
+        self._dataplex_clients.clear()
+        self._caches.clear()
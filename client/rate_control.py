@@ -0,0 +1,134 @@
+import time
+import random
+import asyncio
+from metrics import metrics
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Returns a random delay before the retry following the given attempt (exponential backoff
+    with full jitter), so that clients failing together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class AimdLimiter:
+    """
+    Limits the number of concurrent requests, adjusting the limit to the health of the server:
+    the limit grows by `increase` per limit of successful requests (additive increase) and is
+    multiplied by `decrease` when the server is overloaded (multiplicative decrease).
+
+    Overload reported by requests started before the last decrease is ignored, as they were sent
+    under the previous limit, so that a single burst of errors shrinks the limit only once.
+    """
+    def __init__(self, max_limit: int, min_limit: int = 1, increase: float = 1.0, decrease: float = 0.5):
+        self.limit = float(max_limit)
+        self._max_limit = max_limit
+        self._min_limit = min_limit
+        self._increase = increase
+        self._decrease = decrease
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+        metrics.add("concurrency_limit", max_limit)
+
+    async def acquire(self) -> float:
+        """
+        Waits until the request fits into the limit. Returns the time the request was started at,
+        which is to be passed to release.
+        """
+        async with self._condition:
+            try:
+                await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            except asyncio.CancelledError:
+                # The slot this waiter may have been woken up for goes to another one
+                self._condition.notify(1)
+                raise
+            self._in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, overloaded: bool):
+        """
+        Frees the slot of a finished request and adjusts the limit by its outcome.
+        """
+        previous = int(self.limit)
+        if not overloaded:
+            self.limit = min(self._max_limit, self.limit + self._increase / self.limit)
+        elif started >= self._last_decrease:
+            self.limit = max(self._min_limit, self.limit * self._decrease)
+            self._last_decrease = time.monotonic()
+            metrics.inc("concurrency_decreases_total")
+        if int(self.limit) != previous:
+            metrics.add("concurrency_limit", int(self.limit) - previous)
+
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify(1 + max(0, int(self.limit) - previous))
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a failing server. After failure_threshold consecutive failures the
+    circuit opens and requests wait for reset_timeout, then a single probe request is let through.
+    If the probe succeeds the circuit closes, otherwise it opens again for twice as long.
+    """
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 2.0, max_reset_timeout: float = 60.0):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._max_reset_timeout = max_reset_timeout
+        self._timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> bool:
+        """
+        Waits until a request is allowed to be sent. Returns whether the request is the probe,
+        which has to be recorded as a success or failure, or else cancelled with cancel_probe.
+        """
+        while self._failures >= self._failure_threshold:
+            now = time.monotonic()
+            if now < self._open_until:
+                await asyncio.sleep(self._open_until - now)
+            elif not self._probing:
+                self._probing = True
+                return True
+            else:
+                await self._changed.wait()
+        return False
+
+    def cancel_probe(self):
+        """
+        Lets another request probe the server, when the probe ended without an outcome (e.g. it was cancelled).
+        """
+        if self._probing:
+            self._probing = False
+            self._notify()
+
+    def record_success(self):
+        """
+        Closes the circuit.
+        """
+        if self._failures >= self._failure_threshold:
+            self._notify()
+        self._failures = 0
+        self._probing = False
+        self._timeout = self._reset_timeout
+
+    def record_failure(self):
+        """
+        Counts a failure, opening the circuit once there are too many of them in a row.
+        """
+        self._failures += 1
+        if self._probing or self._failures == self._failure_threshold:
+            if self._probing:
+                self._timeout = min(self._max_reset_timeout, self._timeout * 2)
+            self._probing = False
+            self._open_until = time.monotonic() + self._timeout
+            metrics.inc("circuit_breaker_opened_total")
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+from client.dataplex_catalog import DataplexCatalogClient
+from client.rate_control import backoff_delay
+from exceptions import AppException, ApiClientException
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TransferPoller:
+    """
+    Tracks every resource whose transfer was initiated and resolves a future per resource as soon as
+    its transfer is seen as finished. Finished transfers are reported by the Dataplex watch stream,
+    while it is not available all the resources are polled together with bulk status requests.
+    """
+    def __init__(
+        self,
+        client: DataplexCatalogClient,
+        min_interval: float = 0.5,
+        max_interval: float = 8.0,
+        timeout: float = 300.0,
+        watch: bool = True,
+    ):
+        """
+        Initializes the poller for the given client.
+
+        With watch, the poller subscribes to the stream of finished transfers once and keeps
+        reconnecting to it. While subscribed, resources are polled only once right after subscribing,
+        to catch the transfers which finished before, and when they time out.
+
+        The delay between polls grows from min_interval up to max_interval while nothing finishes,
+        and drops back to min_interval as soon as something does. Once transfers were seen
+        finishing, no polls are sent until the oldest pending transfer is expected to finish.
+        A resource not finished within timeout seconds fails with ApiClientException.
+        """
+        self._client = client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._timeout = timeout
+        self._watch = watch
+        self._interval = min_interval
+        self._expected_duration = None
+        self._previous_poll = 0.0
+        self._pending = {}
+        self._started = {}
+        # Finished transfers reported before their resources were watched, by the time they were reported
+        self._finished_early = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._listener = None
+        # Whether the watch stream is delivering events, and whether a poll is due after subscribing
+        self._subscribed = False
+        self._reconcile = False
+        self._subscription_changed = asyncio.Event()
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        if self._watch:
+            self._listener = asyncio.create_task(self._listen())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        tasks = [task for task in (self._task, self._listener) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._started.clear()
+        self._finished_early.clear()
+
+    def watch(self, resource_id: str) -> asyncio.Future:
+        """
+        Starts tracking a resource with initiated transfer.
+        Returns a future resolved with True once the transfer is finished.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._finished_early.pop(resource_id, None) is not None:
+            # The transfer finished before the request initiating it returned
+            metrics.inc("transfer_events_total")
+            future.set_result(True)
+            return future
+        self._pending[resource_id] = future
+        self._started[resource_id] = asyncio.get_running_loop().time()
+        self._wakeup.set()
+        return future
+
+    def _resolve(self, resource_id: str):
+        """
+        Resolves the future of a pending resource whose transfer is finished.
+        """
+        del self._started[resource_id]
+        future = self._pending.pop(resource_id)
+        if not future.done():
+            future.set_result(True)
+
+    def _set_subscribed(self, subscribed: bool):
+        self._subscribed = subscribed
+        # Transfers finished while not subscribed were not reported
+        self._reconcile = subscribed and bool(self._pending)
+        self._subscription_changed.set()
+
+    async def _listen(self):
+        """
+        Resolves pending resources as the watch stream reports their transfers finished, reconnecting
+        after failures until cancelled. Stops if the server does not offer the stream.
+        """
+        cursor, failures = None, 0
+        while True:
+            try:
+                async for cursor, resource_ids in self._client.watch_finished_transfers(cursor):
+                    if not self._subscribed:
+                        logger.debug("Watching finished transfers")
+                        self._set_subscribed(True)
+                        failures = 0
+                    now = asyncio.get_running_loop().time()
+                    for resource_id in resource_ids:
+                        if resource_id in self._pending:
+                            metrics.inc("transfer_events_total")
+                            self._record_duration(now - self._started[resource_id])
+                            self._resolve(resource_id)
+                        else:
+                            self._finished_early[resource_id] = now
+                    self._forget_finished_early(now)
+            except ApiClientException as e:
+                logger.info(f"Finished transfers can not be watched, polling instead: {str(e)}")
+                self._set_subscribed(False)
+                return
+            except AppException as e:
+                metrics.error("watch", e)
+                if self._subscribed:
+                    logger.warning(f"Lost the watch of finished transfers, polling until reconnected: {str(e)}")
+                    self._set_subscribed(False)
+            await asyncio.sleep(backoff_delay(failures, self._min_interval, self._max_interval))
+            failures += 1
+
+    def _forget_finished_early(self, now: float):
+        """
+        Forgets finished transfers reported too long ago to be of resources about to be watched,
+        e.g. the ones initiated by other clients.
+        """
+        while self._finished_early:
+            resource_id = next(iter(self._finished_early))
+            if now - self._finished_early[resource_id] <= self._timeout:
+                break
+            del self._finished_early[resource_id]
+
+    def _next_delay(self) -> float:
+        """
+        Returns the delay until the next poll.
+        """
+        if self._expected_duration is not None:
+            expected = min(self._started.values()) + self._expected_duration
+            until_expected = expected - asyncio.get_running_loop().time()
+            if until_expected > self._min_interval:
+                # Nothing is expected to finish before that, back off from scratch once it's due
+                self._interval = self._min_interval
+                return min(until_expected, self._max_interval)
+        return self._interval
+
+    def _record_duration(self, duration: float):
+        """
+        Updates the moving average of observed transfer durations.
+        """
+        if self._expected_duration is None:
+            self._expected_duration = duration
+        else:
+            self._expected_duration = 0.8 * self._expected_duration + 0.2 * duration
+
+    async def _poll(self):
+        """
+        Polls the status of all pending resources once, resolving finished and timed out ones.
+        """
+        polled_at = asyncio.get_running_loop().time()
+        metrics.inc("status_polls_total")
+        try:
+            statuses = await self._client.get_transfer_statuses(list(self._pending))
+        except AppException as e:
+            # Don't want to fail the whole transfer in case it's a one-time occasion, timeouts still apply
+            logger.warning("Unable to poll transfer status: %s", e)
+            metrics.error("poll", e)
+            statuses = {}
+
+        now = asyncio.get_running_loop().time()
+        finished = 0
+        for resource_id in list(self._pending):
+            if statuses.get(resource_id):
+                finished += 1
+                # If the transfer was still running at the previous poll, that makes a lower bound of its duration
+                started = self._started[resource_id]
+                if self._previous_poll > started:
+                    self._record_duration(self._previous_poll - started)
+                self._resolve(resource_id)
+            elif now - self._started[resource_id] > self._timeout:
+                del self._started[resource_id]
+                future = self._pending.pop(resource_id)
+                if not future.done():
+                    future.set_exception(
+                        ApiClientException(
+                            f'Unable to validate resource "{resource_id}" transfer: timeout.'
+                        )
+                    )
+        self._previous_poll = polled_at
+        # Every resource still pending is going to be polled again
+        metrics.inc("status_poll_retries_total", len(self._pending))
+
+        if finished:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * 2, self._max_interval)
+
+    async def _run(self):
+        """
+        Polls pending resources until cancelled.
+        """
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                self._interval = self._min_interval
+            if self._subscribed:
+                await self._wait_subscribed()
+                continue
+            await asyncio.sleep(self._next_delay())
+            await self._poll()
+
+    async def _wait_subscribed(self):
+        """
+        Waits while subscribed, polling right after subscribing and once the oldest pending resource times out.
+        """
+        if self._reconcile:
+            self._reconcile = False
+            await self._poll()
+            return
+        self._subscription_changed.clear()
+        if not self._pending:
+            return
+        deadline = min(self._started.values()) + self._timeout + self._min_interval
+        try:
+            await asyncio.wait_for(
+                self._subscription_changed.wait(), deadline - asyncio.get_running_loop().time()
+            )
+        except TimeoutError:
+            await self._poll()
@@ -0,0 +1,134 @@
+import math
+from collections import Counter
+from model import Resource
+
+# Largest number of duplicate ids listed in the summary
+SUMMARY_LIMIT = 20
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings with a fixed capacity. It never misses an added string, but reports
+    a string which was not added as present with the given false positive rate (when full).
+    Hashes are salted per process, so the filter is not meant to be persisted.
+    """
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def add(self, item: str) -> bool:
+        """
+        Adds the string, returns whether it was (probably) present already.
+        """
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size, present = self._bits, self._size, True
+        for i in range(self._hashes):
+            position = (h1 + i * h2) % size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                present = False
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, item: str) -> bool:
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return all(
+            self._bits[p >> 3] & (1 << (p & 7))
+            for p in ((h1 + i * h2) % self._size for i in range(self._hashes))
+        )
+
+
+class DuplicateDetector:
+    """
+    Finds resources sharing an id while pages of resources are being fetched.
+
+    By default every id is kept in an exact set. With use_bloom, ids are added to a chain of Bloom
+    filters instead (each twice the capacity of the previous one) and only ids the filters report
+    as seen before are kept as candidates, which are counted exactly by a single pass in finish.
+    That trades a second pass for memory when duplicates are rare.
+    """
+    def __init__(self, use_bloom: bool = False, initial_capacity: int = 1 << 16, false_positive_rate: float = 0.01):
+        self._use_bloom = use_bloom
+        self._false_positive_rate = false_positive_rate
+        self._filters = [BloomFilter(initial_capacity, false_positive_rate)] if use_bloom else []
+        self._seen = {}
+        self._candidates = set()
+
+    def add_page(self, page: list[Resource]):
+        """
+        Registers the ids of a page of resources.
+        """
+        if not self._use_bloom:
+            seen, candidates = self._seen, self._candidates
+            for resource in page:
+                resource_id = resource.id
+                if resource_id in seen:
+                    candidates.add(resource_id)
+                else:
+                    seen[resource_id] = None
+            return
+
+        for resource in page:
+            resource_id = resource.id
+            if any(resource_id in f for f in self._filters[:-1]) or self._filters[-1].add(resource_id):
+                self._candidates.add(resource_id)
+            elif self._filters[-1].count >= self._filters[-1].capacity:
+                self._filters.append(BloomFilter(2 * self._filters[-1].capacity, self._false_positive_rate))
+
+    def finish(self, resources: list[Resource]) -> dict[str, Counter]:
+        """
+        Returns the source types of every resource sharing its id with another one, by id.
+        """
+        if not self._candidates:
+            return {}
+        duplicates = {}
+        for resource in resources:
+            if resource.id in self._candidates:
+                duplicates.setdefault(resource.id, Counter())[resource.type] += 1
+        # Bloom filters report false positives, which occur only once
+        return {id: types for id, types in duplicates.items() if types.total() > 1}
+
+
+def describe_duplicates(duplicates: dict[str, Counter]) -> str:
+    """
+    Summarizes duplicates with their counts and source types, listing at most SUMMARY_LIMIT of them.
+    """
+    by_type = Counter()
+    for types in duplicates.values():
+        by_type.update(types)
+    listed = [
+        f"{id} ({types.total()}x {'/'.join(sorted(map(str, types)))})"
+        for id, types in list(duplicates.items())[:SUMMARY_LIMIT]
+    ]
+    if len(duplicates) > SUMMARY_LIMIT:
+        listed.append(f"and {len(duplicates) - SUMMARY_LIMIT} more")
+    return (
+        f"{len(duplicates)} ids used by {sum(by_type.values())} resources ("
+        + ", ".join(f"{type}: {count}" for type, count in sorted(by_type.items(), key=str))
+        + "). Resources: "
+        + ", ".join(listed)
+    )
+
+
+def remove_duplicates(resources: list[Resource], duplicates) -> int:
+    """
+    Removes all the resources with the given ids from the list in place, without copying it.
+    Returns the number of removed resources.
+    """
+    if not duplicates:
+        return 0
+    kept = 0
+    for resource in resources:
+        if resource.id not in duplicates:
+            resources[kept] = resource
+            kept += 1
+    removed = len(resources) - kept
+    del resources[kept:]
+    return removed
@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+from model import Resource, orjson
+
+
+def content_hash(resource: Resource) -> str:
+    """
+    Returns a hash of the resource content, independent of the key order.
+    """
+    # Records are serialized with orjson if it is installed, which differs from json in details
+    # (e.g. of floats), so the hash is taken of the encoding of the json module in any case
+    if orjson is None:
+        canonical = resource.encode()
+    else:
+        canonical = json.dumps(
+            resource.to_record(), sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+def load_state(path: str) -> dict[str, str]:
+    """
+    Loads the content hashes of resources transferred by previous runs.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_state(path: str, hashes: dict[str, str]) -> None:
+    """
+    Saves the content hashes of transferred resources, replacing the previous state atomically.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(hashes, file)
+    os.replace(tmp_path, path)
+
+
+def select_changed_resources(resources: list[Resource], previous: dict[str, str]) -> tuple[list[Resource], set]:
+    """
+    Splits resources into the ones which need to be transferred and the ids of unchanged ones.
+
+    A resource needs to be transferred if it is new, if its content has changed since the previous
+    run, or if any of its (transitive) dependencies is going to be transferred, since the change
+    invalidates its dependents.
+    """
+    dependents = {}
+    for resource in resources:
+        for dep in resource.dependencies:
+            dependents.setdefault(dep, []).append(resource.id)
+
+    stack = [r.id for r in resources if previous.get(r.id) != content_hash(r)]
+    changed = set()
+    while stack:
+        resource_id = stack.pop()
+        if resource_id in changed:
+            continue
+        changed.add(resource_id)
+        stack.extend(dependents.get(resource_id, []))
+
+    unchanged = {r.id for r in resources} - changed
+    return [r for r in resources if r.id in changed], unchanged
@@ -0,0 +1,315 @@
+import sys
+from array import array
+from itertools import accumulate, chain
+from collections import Counter
+from dataclasses import dataclass
+
+# Number of hashes kept per node to count its transitive dependents, counts below it are exact
+DOWNSTREAM_SKETCH_SIZE = 16
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = 2**64 - 1
+
+
+@dataclass
+class GraphValidation:
+    """
+    Outcome of validating a dependency graph, with resources referred to by their node index.
+    """
+    # Existing resources with all dependencies satisfied, in the order they can be transferred
+    layers: list[list[int]]
+    # Resources which do not exist, and existing resources depending on them (transitively)
+    missing: list[int]
+    # Resources which are part of a dependency cycle
+    cycle_members: list[int]
+    # Resources which are not part of a cycle, but depend on one (transitively)
+    blocked_by_cycles: list[int]
+
+
+class DependencyGraph:
+    """
+    A compact dependency graph. Resource ids are interned to integer node indices and edges are kept
+    in CSR (compressed sparse row) arrays, in both directions: dependencies of each node and nodes
+    depending on it (backrefs). Every algorithm runs in linear time and memory.
+    """
+    def __init__(self):
+        """
+        Initializes an empty graph, use from_resources to build one.
+        """
+        self.ids = []
+        self.index = {}
+        self.exists = bytearray()
+        self.dep_offsets = array("q", [0])
+        self.deps = array("l")
+        self.backref_offsets = array("q", [0])
+        self.backrefs = array("l")
+        # Transfer priorities of ordered nodes, computed by validate
+        self.downstream_depth = array("l")
+        self.downstream_count = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _intern(self, resource_id: str) -> int:
+        """
+        Returns node index of the resource id, adding a new node if needed.
+        """
+        node = self.index.get(resource_id)
+        if node is None:
+            node = len(self.ids)
+            self.index[resource_id] = node
+            self.ids.append(sys.intern(resource_id))
+            self.exists.append(0)
+        return node
+
+    @classmethod
+    def from_resources(cls, resources, transferred: set = frozenset()) -> "DependencyGraph":
+        """
+        Builds the graph of the given resources. Nodes are added for both resources and their
+        dependencies, dependencies on already transferred resources are left out.
+        """
+        resources = list(resources)
+        graph = cls()
+
+        # Resources take the first node indices, so their dependencies are appended in node order
+        graph.ids = ids = [resource.id for resource in resources]
+        graph.index = index = dict(zip(ids, range(len(ids))))
+        dependency_lists = [resource.dependencies for resource in resources]
+        if len(index) < len(ids):
+            # A resource id is used more than once, dependencies of all its copies are merged
+            merged = {}
+            for resource in resources:
+                merged.setdefault(resource.id, []).extend(resource.dependencies)
+            graph.ids = ids = list(merged)
+            graph.index = index = dict(zip(ids, range(len(ids))))
+            dependency_lists = list(merged.values())
+        graph.exists = bytearray(b"\x01") * len(ids)
+
+        if transferred:
+            dependency_lists = [[d for d in deps if d not in transferred] for deps in dependency_lists]
+        offsets = array("q", accumulate(map(len, dependency_lists), initial=0))
+        try:
+            deps = array("l", map(index.__getitem__, chain.from_iterable(dependency_lists)))
+        except KeyError:
+            # Some of the dependencies do not exist, they get nodes of their own
+            deps = array("l", map(graph._intern, chain.from_iterable(dependency_lists)))
+
+        # Nodes of non-existing dependencies have no dependencies themselves
+        offsets.extend(array("q", [len(deps)]) * (len(graph.ids) - len(dependency_lists)))
+        graph.dep_offsets, graph.deps = offsets, deps
+        graph.backref_offsets, graph.backrefs = cls._invert(len(ids), offsets, deps)
+        return graph
+
+    @staticmethod
+    def _invert(size: int, offsets: array, targets: array) -> tuple[array, array]:
+        """
+        Builds CSR arrays of the reversed edges with a counting sort by target node.
+        """
+        counts = Counter(targets)
+        inverted_offsets = array("q", accumulate((counts.get(n, 0) for n in range(size)), initial=0))
+
+        position = array("q", inverted_offsets)
+        inverted = array("l", bytes(targets.itemsize * len(targets)))
+        for source in range(size):
+            for target in targets[offsets[source] : offsets[source + 1]]:
+                inverted[position[target]] = source
+                position[target] += 1
+        return inverted_offsets, inverted
+
+    def dependencies_of(self, node: int) -> array:
+        """
+        Returns node indices of the dependencies of the node.
+        """
+        return self.deps[self.dep_offsets[node] : self.dep_offsets[node + 1]]
+
+    def dependents_of(self, node: int) -> array:
+        """
+        Returns node indices of the nodes depending on the node, once per dependency entry.
+        """
+        return self.backrefs[self.backref_offsets[node] : self.backref_offsets[node + 1]]
+
+    def backrefs_of(self, resource_id: str) -> list[str]:
+        """
+        Returns ids of the resources depending on the resource, once per dependency entry.
+        """
+        return [self.ids[node] for node in self.dependents_of(self.index[resource_id])]
+
+    def weakly_connected_components(self, nodes) -> list[list[int]]:
+        """
+        Splits the given nodes into groups connected by dependencies among them, in either direction.
+        Nodes of different groups do not depend on each other, so each group can be transferred alone.
+        """
+        selected = bytearray(len(self))
+        for node in nodes:
+            selected[node] = 1
+
+        components = []
+        for root in range(len(self)):
+            if not selected[root]:
+                continue
+            selected[root] = 0
+            component, stack = [], [root]
+            while stack:
+                node = stack.pop()
+                component.append(node)
+                for neighbour in chain(self.dependencies_of(node), self.dependents_of(node)):
+                    if selected[neighbour]:
+                        selected[neighbour] = 0
+                        stack.append(neighbour)
+            components.append(component)
+        return components
+
+    def validate(self) -> GraphValidation:
+        """
+        Orders the graph into layers with Kahn's algorithm, propagating missing dependencies to
+        their dependents, and explains what is left unordered with strongly connected components.
+        """
+        size = len(self)
+        outbound = array("q", (self.dep_offsets[n + 1] - self.dep_offsets[n] for n in range(size)))
+        missing = bytearray(1 - e for e in self.exists)
+        processed = bytearray(size)
+
+        layers = []
+        layer = [node for node in range(size) if outbound[node] == 0]
+        while layer:
+            next_layer = []
+            for node in layer:
+                processed[node] = 1
+                is_missing = missing[node]
+                for dependent in self.dependents_of(node):
+                    if is_missing:
+                        missing[dependent] = 1
+                    outbound[dependent] -= 1
+                    if outbound[dependent] == 0:
+                        next_layer.append(dependent)
+            layers.append([node for node in layer if not missing[node]])
+            layer = next_layer
+
+        self._compute_priorities(layers)
+        in_cycle = self._find_cycle_members(processed)
+        return GraphValidation(
+            layers=layers,
+            missing=[node for node in range(size) if missing[node]],
+            # Members of cycles which depend on a missing resource are reported as missing only
+            cycle_members=[node for node in range(size) if in_cycle[node] and not missing[node]],
+            blocked_by_cycles=[
+                node
+                for node in range(size)
+                if not processed[node] and not missing[node] and not in_cycle[node]
+            ],
+        )
+
+    def _compute_priorities(self, layers: list[list[int]]):
+        """
+        Computes, for every node in the layers, the length of the longest chain of nodes depending
+        on it (downstream depth) and the number of distinct nodes depending on it transitively
+        (downstream count).
+
+        Counting every dependent once takes the set of them, which may be as large as the graph
+        for every node, so the sets are kept as k-minimum-values sketches instead: the
+        DOWNSTREAM_SKETCH_SIZE smallest hashes of the dependents. Sketches of direct dependents are
+        merged up the layers, so a dependent reachable by several paths is counted once. Counts
+        below the sketch size are exact, larger ones are estimated from the largest hash kept
+        (with a relative error around 1 / sqrt(DOWNSTREAM_SKETCH_SIZE)).
+        """
+        size = len(self)
+        depth = array("l", [0]) * size
+        count = array("q", [0]) * size
+        ordered = bytearray(size)
+        k = DOWNSTREAM_SKETCH_SIZE
+        # Multiplying by an odd constant is a bijection of 64-bit integers, so hashes of nodes differ
+        hashes = [(node + 1) * _HASH_MULTIPLIER & _HASH_MASK for node in range(size)]
+        # Sketches of ordered nodes, each dropped once all the nodes depending on it have merged it
+        sketches = [None] * size
+        unmerged = array("q", (self.dep_offsets[n + 1] - self.dep_offsets[n] for n in range(size)))
+        backref_offsets, backrefs = self.backref_offsets, self.backrefs
+        # Dependents are always in later layers, so walking the layers backwards visits them first
+        for layer in reversed(layers):
+            for node in layer:
+                ordered[node] = 1
+                node_depth, reachable = 0, []
+                for dependent in backrefs[backref_offsets[node] : backref_offsets[node + 1]]:
+                    if not ordered[dependent]:
+                        continue  # it is not going to be transferred
+                    if depth[dependent] >= node_depth:
+                        node_depth = depth[dependent] + 1
+                    reachable += sketches[dependent]
+                    reachable.append(hashes[dependent])
+                    unmerged[dependent] -= 1
+                    if not unmerged[dependent]:
+                        sketches[dependent] = None
+                depth[node] = node_depth
+                # Sketches hold distinct hashes, but one reachable by several paths repeats here
+                reachable.sort()
+                sketch, last = [], None
+                for value in reachable:
+                    if value != last:
+                        sketch.append(value)
+                        last = value
+                        if len(sketch) == k:
+                            break
+                sketches[node] = sketch
+                if len(sketch) < k:
+                    count[node] = len(sketch)
+                else:
+                    count[node] = min(size, int((k - 1) * (_HASH_MASK + 1) / (sketch[-1] + 1)))
+        self.downstream_depth, self.downstream_count = depth, count
+
+    def _find_cycle_members(self, processed: bytearray) -> bytearray:
+        """
+        Marks the nodes which belong to a cycle, using iterative Tarjan's algorithm over the
+        nodes left unprocessed by Kahn's algorithm (every cycle is left there).
+        """
+        size = len(self)
+        in_cycle = bytearray(size)
+        unset = -1
+        order = array("q", [unset]) * size
+        lowlink = array("q", [unset]) * size
+        on_stack = bytearray(size)
+        stack, counter = [], 0
+
+        for root in range(size):
+            if processed[root] or order[root] != unset:
+                continue
+            # Call stack of (node, position of the next dependency to visit)
+            calls = [(root, self.dep_offsets[root])]
+            order[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+
+            while calls:
+                node, position = calls[-1]
+                if position < self.dep_offsets[node + 1]:
+                    calls[-1] = (node, position + 1)
+                    dep = self.deps[position]
+                    if processed[dep]:
+                        continue
+                    if order[dep] == unset:
+                        order[dep] = lowlink[dep] = counter
+                        counter += 1
+                        stack.append(dep)
+                        on_stack[dep] = 1
+                        calls.append((dep, self.dep_offsets[dep]))
+                    elif on_stack[dep]:
+                        lowlink[node] = min(lowlink[node], order[dep])
+                    continue
+
+                calls.pop()
+                if calls:
+                    parent = calls[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] != order[node]:
+                    continue
+
+                # The node is a root of a strongly connected component, pop it from the stack
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in self.dependencies_of(node):
+                    for member in component:
+                        in_cycle[member] = 1
+        return in_cycle
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import logging
+
+PENDING = "pending"
+INITIATED = "initiated"
+FINISHED = "finished"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class TransferJournal:
+    """
+    Append-only on-disk journal of resource transfer states, one JSON line per state change.
+    It allows an interrupted transfer to be resumed without re-sending finished resources.
+    """
+    def __init__(self, path: str, resume: bool = False, sync_every: int = 1000, sync_interval: float = 1.0):
+        """
+        Opens the journal at the given path. When resuming, the states recorded by previous runs are
+        loaded and new records are appended, otherwise the journal is started from scratch. A journal
+        of an unfinished transfer is then not overwritten, but moved aside to <path>.1 first.
+
+        Records are handed to the OS with every record call, so they survive a crash of the process,
+        but are fsynced at most once per sync_every records or sync_interval seconds.
+        """
+        self.states = self._load(path) if resume else {}
+        if not resume and any(state != FINISHED for state in self._load(path).values()):
+            os.replace(path, path + ".1")
+            logger.warning(
+                f"Journal {path} of an unfinished transfer moved to {path}.1 "
+                "(move it back and use --resume to resume that transfer)"
+            )
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _load(path: str) -> dict[str, str]:
+        """
+        Reads the last recorded state of every resource from the journal file.
+        """
+        states = {}
+        if not os.path.exists(path):
+            return states
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line which was being written when the previous run crashed
+                states[record["id"]] = record["state"]
+        return states
+
+    def record(self, resource_ids, state: str):
+        """
+        Records a new state of the given resources.
+        """
+        for resource_id in resource_ids:
+            self.states[resource_id] = state
+            self._file.write(json.dumps({"id": resource_id, "state": state}) + "\n")
+            self._unsynced += 1
+
+        if self._unsynced >= self._sync_every or time.monotonic() - self._last_sync >= self._sync_interval:
+            self.sync()
+        else:
+            self._file.flush()
+
+    def sync(self):
+        """
+        Flushes all the buffered records to disk.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """
+        Flushes the buffered records and closes the journal file.
+        """
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
@@ -0,0 +1,232 @@
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import logging.handlers
+from queue import Empty, SimpleQueue
+from datetime import datetime, timezone
+from metrics import endpoint_label
+
+LOG_FILE = "data_catalog_transfer.log"
+# Size of the log file's write buffer
+FILE_BUFFER_SIZE = 256 * 1024
+# Longest time written records are kept in the buffers before they are flushed
+FLUSH_INTERVAL = 1.0
+# Seconds between summaries of successful HTTP requests
+REQUEST_SUMMARY_INTERVAL = 10.0
+
+# Attributes every record has, the other ones were passed in extra and are written into JSON lines
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# Background writer of the records, and the summary of HTTP requests
+_listener = None
+_request_summary = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats every record as a JSON object on a line of its own, together with the fields passed in extra.
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    Writes records without flushing the stream, the listener flushes it once per batch of records.
+    """
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    Appends records to a file through a large write buffer, flushed once per batch of records.
+    """
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=FILE_BUFFER_SIZE, encoding=self.encoding, errors=self.errors)
+
+    emit = BufferedStreamHandler.emit
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a listener of the same process. Records are not copied and formatted as
+    they would be to be pickled, only their message is rendered so that later changes of the
+    arguments do not show in it.
+    """
+    def prepare(self, record):
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    Writes the queued records with the handlers in a background thread. The handlers are flushed
+    once the queue is drained, or FLUSH_INTERVAL after the previous flush while records keep coming.
+    """
+    def __init__(self, queue, *handlers):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self._flushed = time.monotonic()
+
+    def dequeue(self, block):
+        if not block:
+            return self.queue.get(block=False)
+        if time.monotonic() - self._flushed >= FLUSH_INTERVAL:
+            self.flush()
+        try:
+            return self.queue.get(block=False)
+        except Empty:
+            self.flush()
+            return self.queue.get()
+
+    def flush(self):
+        """
+        Flushes all the handlers.
+        """
+        for handler in self.handlers:
+            handler.flush()
+        self._flushed = time.monotonic()
+
+    def stop(self):
+        super().stop()
+        self.flush()
+
+
+class RequestLogSummary(logging.Filter):
+    """
+    Filter of the httpx logger, which logs a line per HTTP request. Failed requests are let through.
+    Successful ones are counted by endpoint and status and, if summarize, logged as a single summary
+    line at most every REQUEST_SUMMARY_INTERVAL seconds, otherwise dropped.
+    """
+    def __init__(self, summarize: bool = True):
+        super().__init__()
+        self._summarize = summarize
+        self._counts = {}
+        self._since = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if hasattr(record, "requests"):
+            return True
+        try:
+            method, url, _, status, _ = record.args
+            path = url.path
+        except (TypeError, ValueError, AttributeError):
+            return True
+        if status >= 400:
+            return True
+        if not self._summarize:
+            return False
+
+        key = f"{endpoint_label(method, path)} {status}"
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if time.monotonic() - self._since < REQUEST_SUMMARY_INTERVAL:
+                return False
+            # The record of this request carries the summary instead
+            record.msg, record.args, record.requests = self._take_summary()
+        return True
+
+    def _take_summary(self) -> tuple[str, tuple, dict]:
+        """
+        Returns the message, the arguments and the counts of the summary of counted requests,
+        and starts counting anew.
+        """
+        now = time.monotonic()
+        counts, elapsed = self._counts, now - self._since
+        self._counts, self._since = {}, now
+        requests = ", ".join(f"{count} x {key}" for key, count in sorted(counts.items()))
+        return "HTTP requests in the last %.1f s: %s", (elapsed, requests), counts
+
+    def flush(self):
+        """
+        Logs the summary of the requests counted since the previous one, if any.
+        """
+        with self._lock:
+            if not self._counts:
+                return
+            msg, args, counts = self._take_summary()
+        logging.getLogger("httpx").info(msg, *args, extra={"requests": counts})
+
+
+def configure_request_log(mode: str) -> RequestLogSummary | None:
+    """
+    Configures how HTTP requests are logged: "all" logs every request, "summary" logs failed
+    requests and periodic summaries of the successful ones, "errors" logs failed requests only.
+    """
+    global _request_summary
+    httpx_logger = logging.getLogger("httpx")
+    for log_filter in httpx_logger.filters[:]:
+        if isinstance(log_filter, RequestLogSummary):
+            httpx_logger.removeFilter(log_filter)
+    _request_summary = None
+    if mode != "all":
+        _request_summary = RequestLogSummary(summarize=mode == "summary")
+        httpx_logger.addFilter(_request_summary)
+    return _request_summary
+
+
+def flush_request_log():
+    """
+    Logs the summary of the HTTP requests made since the previous one, if they are summarized.
+    """
+    if _request_summary is not None:
+        _request_summary.flush()
+
+
+def start_logging(handlers: list[logging.Handler], level: int, request_log: str = "summary"):
+    """
+    Sends the records of the root logger to a queue, and writes them with the handlers in a
+    background thread, so that logging never blocks on I/O. Messages below the level are dropped
+    before they are formatted.
+    """
+    global _listener
+    stop_logging()
+    # No format uses the caller, thread, process or task of a record, so they are not looked up
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = logging.logAsyncioTasks = False
+    queue = SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [LocalQueueHandler(queue)]
+    root.setLevel(level)
+    configure_request_log(request_log)
+    _listener = BatchingQueueListener(queue, *handlers)
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Logs the last summary of HTTP requests, writes out all the queued records and stops the background writer.
+    """
+    global _listener
+    flush_request_log()
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    root = logging.getLogger()
+    root.handlers[:] = [handler for handler in root.handlers if not isinstance(handler, logging.handlers.QueueHandler)]
+    listener.stop()
+    for handler in listener.handlers:
+        if handler.stream not in (sys.stdout, sys.stderr):
+            handler.close()
+
+
+atexit.register(stop_logging)
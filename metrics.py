@@ -0,0 +1,237 @@
+import re
+import json
+import time
+import bisect
+import cProfile
+from contextlib import contextmanager
+
+# Upper bounds of histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 20, 30, 60, 120)
+
+_RESOURCE_PATH = re.compile(r"^(/dataplex_catalog/[^/]+)/[^/]+$")
+
+
+def endpoint_label(method: str, path: str) -> str:
+    """
+    Returns the endpoint of the request, with resource ids replaced by a placeholder.
+    """
+    return method + " " + _RESOURCE_PATH.sub(r"\1/{id}", path)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as exposed by Prometheus.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, share: float) -> float | None:
+        """
+        Estimates the quantile as the upper bound of the bucket it falls into.
+        """
+        if not self.count:
+            return None
+        rank, seen = share * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    Registry of counters, gauges, histograms and phase timers of a transfer run.
+    Every metric is identified by its name and labels.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.peaks = {}
+        self.histograms = {}
+        self.phases = {}
+
+    def reset(self):
+        """
+        Forgets all the metrics recorded so far, e.g. before the next migration of the same process.
+        """
+        self.__init__()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increases a counter.
+        """
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """
+        Changes a gauge by the value, keeping track of its peak.
+        """
+        key = self._key(name, labels)
+        current = self.gauges[key] = self.gauges.get(key, 0) + value
+        if current > self.peaks.get(key, 0):
+            self.peaks[key] = current
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Records a value in a histogram.
+        """
+        key = self._key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    def error(self, stage: str, exception: Exception):
+        """
+        Counts an error of the stage by its exception class.
+        """
+        self.inc("errors_total", stage=stage, exception=type(exception).__name__)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measures wall-clock duration of a phase of the run.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - started
+
+    @contextmanager
+    def in_flight(self, name: str, **labels):
+        """
+        Counts the block as in flight in a gauge, for as long as it runs.
+        """
+        self.add(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add(name, -1, **labels)
+
+    def merge(self, other: "Metrics"):
+        """
+        Adds metrics of another registry (e.g. of a worker process) to this one. Peaks of gauges
+        are summed, as the workers are running at the same time.
+        """
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, value in other.peaks.items():
+            self.peaks[key] = self.peaks.get(key, 0) + value
+        for key, histogram in other.histograms.items():
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(histogram.buckets)
+            merged = self.histograms[key]
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.sum += histogram.sum
+            merged.count += histogram.count
+
+    def to_json(self) -> dict:
+        """
+        Returns a summary of all the metrics.
+        """
+        def label(key):
+            name, labels = key
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        return {
+            "phases_seconds": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "counters": {label(key): value for key, value in sorted(self.counters.items())},
+            "gauges_peak": {label(key): value for key, value in sorted(self.peaks.items())},
+            "histograms": {
+                label(key): {
+                    "count": h.count,
+                    "sum": round(h.sum, 4),
+                    "avg": round(h.sum / h.count, 4) if h.count else None,
+                    "p50": h.quantile(0.5),
+                    "p90": h.quantile(0.9),
+                    "p99": h.quantile(0.99),
+                }
+                for key, h in sorted(self.histograms.items())
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all the metrics in Prometheus text exposition format.
+        """
+        def series(name, labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return name
+            return name + "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{series('transfer_' + name, labels)} {value}")
+        for (name, labels), value in sorted(self.peaks.items()):
+            lines.append(f"{series('transfer_' + name + '_peak', labels)} {value}")
+        for name, seconds in sorted(self.phases.items()):
+            lines.append(f"{series('transfer_phase_seconds', (), [('phase', name)])} {seconds}")
+        for (name, labels), h in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f"{series('transfer_' + name + '_bucket', labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{series('transfer_' + name + '_bucket', labels, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{series('transfer_' + name + '_sum', labels)} {h.sum}")
+            lines.append(f"{series('transfer_' + name + '_count', labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, format: str = "json"):
+        """
+        Writes all the metrics to the file, as JSON summary or in Prometheus text format.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            if format == "prometheus":
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), file, indent=2)
+
+
+@contextmanager
+def profiled(profiler: str | None, path: str):
+    """
+    Profiles the block with cProfile or pyinstrument (optional package), writing the report to path.
+    """
+    if profiler is None:
+        yield
+        return
+
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+
+        instrument = Profiler()
+        instrument.start()
+        try:
+            yield
+        finally:
+            instrument.stop()
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(instrument.output_text())
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+# Metrics of the current run
+metrics = Metrics()
@@ -0,0 +1,97 @@
+"""
+Library entry point of the migration from Data Catalog to Dataplex.
+
+    from migration import run_migration
+
+    result = run_migration({"api_url": "http://127.0.0.1:5000/", "journal": "project-a.journal", "delta": True})
+    if not result.succeeded:
+        print(result.error)
+
+The configuration takes the options of the CLI, named with underscores, and their CLI defaults.
+Logging is left to the application (see utils.get_logger). The transfer and its HTTP clients are
+imported on the first run only, so importing this module is cheap.
+"""
+import time
+from argparse import Namespace
+from dataclasses import dataclass, field, asdict
+from metrics import metrics
+from utils import parse_cli_args
+
+
+@dataclass
+class MigrationResult:
+    """
+    Outcome of a migration.
+    """
+    # Why the migration was stopped before transferring anything, None if it was not
+    error: str | None = None
+    # Resources received from Data Catalog, ids used by more than one of them
+    fetched: int = 0
+    duplicates: list[str] = field(default_factory=list)
+    # Resources failing validation, valid ones to be transferred, and valid ones unchanged since the previous run
+    invalid: int = 0
+    valid: int = 0
+    unchanged: int = 0
+    # Ids of the valid resources which are transferred
+    transferred: list[str] = field(default_factory=list)
+    # Predicted transfer of a dry run (simulator.SimulationResult)
+    simulation: object | None = None
+    seconds: float = 0.0
+    # Metrics of the migration, as exported into the metrics file
+    metrics: dict = field(default_factory=dict)
+
+    @property
+    def succeeded(self) -> bool:
+        """
+        Whether every valid resource was transferred, or predicted to be by a dry run.
+        """
+        return self.error is None and (self.simulation is not None or len(self.transferred) == self.valid)
+
+    def to_json(self) -> dict:
+        """
+        Returns the result as a JSON-serializable dict.
+        """
+        return {"succeeded": self.succeeded, **asdict(self)}
+
+
+def make_config(**options) -> Namespace:
+    """
+    Returns the configuration of a migration: the defaults of the CLI options overridden by the
+    given ones, e.g. make_config(api_url="http://127.0.0.1:5000/", dry_run=True).
+    Raises ValueError for options the CLI does not have.
+    """
+    config = parse_cli_args([])
+    unknown = set(options) - set(vars(config))
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}.")
+    vars(config).update(options)
+    return config
+
+
+async def run_migration_async(config: Namespace | dict, clients=None) -> MigrationResult:
+    """
+    Runs a migration in the running event loop. With a client.pool.ClientPool, the migration uses
+    its clients, kept open for the next migrations, instead of clients of its own.
+    Metrics are reset first, so that the result has the metrics of this migration only.
+    """
+    from transfer import migrate_async
+
+    if isinstance(config, dict):
+        config = make_config(**config)
+    metrics.reset()
+    started = time.perf_counter()
+    result = await migrate_async(config, clients)
+    result.seconds = round(time.perf_counter() - started, 3)
+    result.metrics = metrics.to_json()
+    if config.metrics_file:
+        metrics.export(config.metrics_file, config.metrics_format)
+    return result
+
+
+def run_migration(config: Namespace | dict) -> MigrationResult:
+    """
+    Runs a migration configured by the given options (see make_config) and returns its result.
+    """
+    import asyncio
+
+    return asyncio.run(run_migration_async(config))
@@ -0,0 +1,92 @@
+import sys
+import json
+from dataclasses import dataclass
+from exceptions import DataException
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used instead
+    orjson = None
+
+# Fields of a resource kept as attributes, any other field is kept in the serialized record
+RESOURCE_FIELDS = frozenset(("id", "type", "dependencies"))
+
+
+def loads(data: bytes | str):
+    """
+    Decodes JSON, with orjson if it is installed. Raises ValueError on invalid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value) -> bytes:
+    """
+    Encodes JSON compactly with sorted keys, with orjson if it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+@dataclass(slots=True)
+class Resource:
+    """
+    A Data Catalog resource. Ids and types are interned, so the strings are shared by all the
+    resources referring to them. A record with fields besides id, type and dependencies keeps
+    them serialized in `record`, which is then sent to Dataplex as it is.
+    """
+    id: str
+    type: str
+    dependencies: tuple[str, ...] = ()
+    record: bytes | None = None
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Resource":
+        """
+        Validates a decoded resource record and builds the resource of it.
+        """
+        if not isinstance(record, dict):
+            raise DataException("Unexpected resource format.")
+        if "id" not in record:
+            raise DataException("Resource ID not found.")
+        if "type" not in record:
+            raise DataException("Resource type not found")
+        dependencies = record.get("dependencies", ())
+        if not isinstance(dependencies, (list, tuple)):
+            raise DataException(f'Unexpected dependencies format of resource "{record["id"]}".')
+
+        intern = sys.intern
+        try:
+            return cls(
+                intern(record["id"]),
+                intern(record["type"]),
+                tuple(map(intern, dependencies)),
+                None if record.keys() == RESOURCE_FIELDS else dumps(record),
+            )
+        except TypeError as e:  # ids, types and dependencies are not strings
+            raise DataException(f"Unexpected resource format: {e}") from e
+
+    def to_record(self) -> dict:
+        """
+        Returns the record the resource was built of.
+        """
+        if self.record is not None:
+            return loads(self.record)
+        return {"id": self.id, "type": self.type, "dependencies": list(self.dependencies)}
+
+    def encode(self) -> bytes:
+        """
+        Returns the record serialized as JSON, the same for the same content.
+        """
+        if self.record is not None:
+            return self.record
+        return dumps({"dependencies": self.dependencies, "id": self.id, "type": self.type})
+
+
+def resources_from_records(records) -> list[Resource]:
+    """
+    Builds resources of decoded records.
+    """
+    return [Resource.from_record(record) for record in records]
@@ -0,0 +1,113 @@
+from collections import Counter
+from graph import DependencyGraph, GraphValidation
+from model import Resource
+
+
+class OnlineValidator:
+    """
+    Validates resources as they arrive, instead of once all of them are fetched.
+
+    Every resource counts its distinct dependencies which are not valid yet. A resource becomes
+    valid as soon as the count drops to zero, which releases the resources waiting for it in turn,
+    so valid resources come out in dependency order. Resources which are never released have a
+    missing dependency or depend on a cycle, explained by finish once the input is over.
+
+    The first resource with an id is the one validated, later resources with the same id are only
+    recorded as duplicates. Resources whose content is unchanged since the previous run (delta sync)
+    and which depend only on unchanged resources are valid without being transferred.
+
+    The validator keeps the dependents of every resource, so it stands in for the DependencyGraph
+    when transferring the resources it released.
+    """
+    def __init__(self):
+        # Resources by id, the first one received with each id
+        self.resources = {}
+        # Source types of every id used by more than one resource
+        self.duplicates = {}
+        # Valid resources which are not to be transferred again
+        self.unchanged = set()
+        self._valid = set()
+        # Number of dependencies which are not valid yet, of every resource waiting for them
+        self._waiting = {}
+        self._unchanged_content = set()
+        self._dependents = {}
+
+    def add(self, resource: Resource, unchanged: bool = False) -> list[Resource]:
+        """
+        Adds a received resource, unchanged if its content is the same as in the previous run.
+        Returns the resources which have become valid, in dependency order.
+        """
+        resource_id = resource.id
+        first = self.resources.get(resource_id)
+        if first is not None:
+            types = self.duplicates.get(resource_id)
+            if types is None:
+                types = self.duplicates[resource_id] = Counter((first.type,))
+            types[resource.type] += 1
+            return []
+        self.resources[resource_id] = resource
+
+        waiting_for = 0
+        for dependency in dict.fromkeys(resource.dependencies):
+            self._dependents.setdefault(dependency, []).append(resource_id)
+            if dependency not in self._valid:
+                waiting_for += 1
+        if unchanged:
+            self._unchanged_content.add(resource_id)
+        if waiting_for:
+            self._waiting[resource_id] = waiting_for
+            return []
+
+        released = []
+        self._release(resource, released)
+        return released
+
+    def _release(self, resource: Resource, released: list[Resource]):
+        """
+        Marks the resource valid, together with every resource left waiting only for it (transitively).
+        """
+        stack = [resource]
+        while stack:
+            resource = stack.pop()
+            resource_id = resource.id
+            self._valid.add(resource_id)
+            # A resource depending on a changed one has to be transferred again too
+            if resource_id in self._unchanged_content and all(
+                dependency in self.unchanged for dependency in resource.dependencies
+            ):
+                self.unchanged.add(resource_id)
+            else:
+                released.append(resource)
+            self._unchanged_content.discard(resource_id)
+
+            for dependent in self._dependents.get(resource_id, ()):
+                waiting_for = self._waiting.get(dependent)
+                if waiting_for is None:
+                    continue
+                if waiting_for == 1:
+                    del self._waiting[dependent]
+                    stack.append(self.resources[dependent])
+                else:
+                    self._waiting[dependent] = waiting_for - 1
+
+    def finish(self) -> tuple[DependencyGraph, GraphValidation]:
+        """
+        Explains why the resources which are still waiting did not become valid, once all the
+        resources have been received. Returns their dependency graph and its validation.
+        """
+        graph = DependencyGraph.from_resources(
+            (self.resources[resource_id] for resource_id in self._waiting), transferred=self._valid
+        )
+        return graph, graph.validate()
+
+    def __len__(self):
+        """
+        Returns the number of valid resources, unchanged ones included.
+        """
+        return len(self._valid)
+
+    def backrefs_of(self, resource_id: str) -> list[str]:
+        """
+        Returns ids of the resources depending on the resource, once per resource.
+        """
+        return self._dependents.get(resource_id, [])
@@ -0,0 +1,63 @@
+import heapq
+import itertools
+from graph import DependencyGraph
+
+
+def critical_path_priority(graph: DependencyGraph, resource_id: str) -> tuple:
+    """
+    Prefers resources gating the longest chains of dependents, then the ones with most dependents.
+    """
+    node = graph.index[resource_id]
+    return -graph.downstream_depth[node], -graph.downstream_count[node]
+
+
+def dependents_priority(graph: DependencyGraph, resource_id: str) -> tuple:
+    """
+    Prefers resources with most distinct transitive dependents (see DependencyGraph._compute_priorities),
+    then the ones gating the longest chains.
+    """
+    node = graph.index[resource_id]
+    return -graph.downstream_count[node], -graph.downstream_depth[node]
+
+
+def fifo_priority(graph, resource_id: str) -> tuple:
+    """
+    Keeps resources in the order they became ready. It needs no priorities computed for the graph.
+    """
+    return ()
+
+
+# Priority policies by name, each returning a sort key of a resource (lower keys are dispatched first)
+PRIORITY_POLICIES = {
+    "critical-path": critical_path_priority,
+    "dependents": dependents_priority,
+    "fifo": fifo_priority,
+}
+
+
+class ReadyQueue:
+    """
+    Priority queue of resources ready to be transferred, ordered by the priority policy.
+    Resources of the same priority are dispatched in the order they became ready.
+    """
+    def __init__(self, graph: DependencyGraph, policy=critical_path_priority):
+        self._graph = graph
+        self._policy = policy
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, resource_id: str):
+        """
+        Adds a resource which is ready to be transferred.
+        """
+        key = self._policy(self._graph, resource_id)
+        heapq.heappush(self._heap, (key, next(self._sequence), resource_id))
+
+    def pop_many(self, count: int) -> list[str]:
+        """
+        Removes and returns up to count resources with the highest priority.
+        """
+        return [heapq.heappop(self._heap)[2] for _ in range(min(count, len(self._heap)))]
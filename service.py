@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import itertools
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlsplit
+from client.pool import ClientPool
+from migration import make_config, run_migration_async
+from utils import get_logger
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for their results to be fetched, the oldest ones are forgotten first
+MAX_FINISHED_JOBS = 1000
+# Options of the CLI which configure the process rather than a migration, jobs may not set them
+SERVICE_OPTIONS = {"verbose", "log_level", "log_format", "request_log", "profile", "profile_output"}
+# Options of jobs which are paths, confined to the work directory of the service
+PATH_OPTIONS = ("journal", "state", "metrics_file", "cache_dir", "export")
+
+
+class MigrationService:
+    """
+    Runs migration jobs one after another in an event loop of its own thread. The clients of the
+    Data Catalog and Dataplex APIs and the response caches are kept open between jobs, so small
+    migrations do not pay for process startup, imports and new connections.
+
+    Jobs run one at a time since they share the metrics and the logging of the process. Files
+    jobs read and write (see PATH_OPTIONS and the file:// source) have to be in the work directory.
+    """
+    def __init__(self, work_dir: str = "."):
+        self._work_dir = os.path.realpath(work_dir)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="migrations", daemon=True)
+        self._clients = ClientPool()
+        self._queue = asyncio.Queue()
+        self._runner = None
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._done = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts running the submitted jobs.
+        """
+        self._thread.start()
+        self._runner = asyncio.run_coroutine_threadsafe(self._run_jobs(), self._loop)
+
+    def stop(self):
+        """
+        Cancels the job which is running, if any, and closes the clients.
+        """
+        self._runner.cancel()
+        asyncio.run_coroutine_threadsafe(self._clients.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def submit(self, options: dict) -> dict:
+        """
+        Queues a job migrating with the given options of the CLI (see migration.make_config) and
+        returns it. Raises ValueError if the options are not valid.
+        """
+        config = self._make_job_config(options)
+        with self._lock:
+            job_id = str(next(self._ids))
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "options": options,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._done[job_id] = threading.Event()
+            self._forget_finished()
+            job = dict(self._jobs[job_id])
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (job_id, config))
+        return job
+
+    def job(self, job_id: str, wait: float = 0) -> dict | None:
+        """
+        Returns the job, waiting up to wait seconds for it to finish. Returns None for unknown jobs.
+        """
+        done = self._done.get(job_id)
+        if done is None:
+            return None
+        done.wait(wait)
+        with self._lock:
+            return dict(self._jobs[job_id])
+
+    def jobs(self) -> list[dict]:
+        """
+        Returns all the known jobs, without their results.
+        """
+        with self._lock:
+            return [{**job, "result": None} for job in self._jobs.values()]
+
+    def _make_job_config(self, options: dict):
+        """
+        Returns the configuration of a job, with all of its paths resolved in the work directory.
+        Raises ValueError for options jobs may not set, and paths outside of the work directory.
+        """
+        reserved = SERVICE_OPTIONS & set(options)
+        if reserved:
+            raise ValueError(f"Options of the service cannot be set by jobs: {', '.join(sorted(reserved))}.")
+        config = make_config(**options)
+        for name in PATH_OPTIONS:
+            if getattr(config, name) is not None:
+                setattr(config, name, self._confine(name, getattr(config, name)))
+        if config.source is not None:
+            if not isinstance(config.source, str) or not config.source.startswith("file://"):
+                raise ValueError("Option 'source' must be a file:// URL of a catalog export.")
+            config.source = "file://" + self._confine("source", config.source.removeprefix("file://"))
+        return config
+
+    def _confine(self, name: str, path) -> str:
+        """
+        Returns the path resolved in the work directory, raising ValueError if it leads out of it.
+        """
+        if not isinstance(path, str) or not path:
+            raise ValueError(f"Option '{name}' must be a path.")
+        resolved = os.path.realpath(os.path.join(self._work_dir, path))
+        if os.path.commonpath([resolved, self._work_dir]) != self._work_dir:
+            raise ValueError(f"Option '{name}' must be a path in the work directory of the service.")
+        return resolved
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _forget_finished(self):
+        """
+        Forgets the oldest finished jobs over MAX_FINISHED_JOBS.
+        """
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+            del self._done[job_id]
+
+    async def _run_jobs(self):
+        """
+        Runs the queued jobs until cancelled.
+        """
+        while True:
+            job_id, config = await self._queue.get()
+            self._update(job_id, status="running", started_at=time.time())
+            logger.info("Job %s started", job_id)
+            try:
+                result = await run_migration_async(config, self._clients)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self._update(job_id, status="failed", error=repr(e), finished_at=time.time())
+            else:
+                status = "succeeded" if result.succeeded else "failed"
+                self._update(job_id, status=status, result=result.to_json(), error=result.error, finished_at=time.time())
+                logger.info("Job %s %s in %.1f s", job_id, status, result.seconds)
+            self._done[job_id].set()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the service:
+
+    POST /jobs               submits a job, the body is a JSON object of CLI options, e.g. {"delta": true}
+    POST /jobs?wait=<s>      submits a job and waits up to <s> seconds for it to finish
+    GET /jobs                lists the jobs, without their results
+    GET /jobs/<id>?wait=<s>  returns the job, with its result once it is finished
+    GET /health              returns the number of jobs by status
+    """
+    server_version = "DataCatalogTransfer"
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status: int, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _wait(self, query: dict) -> float:
+        try:
+            return max(0.0, float(query.get("wait", ["0"])[0]))
+        except ValueError:
+            return 0.0
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == "/health":
+            statuses = {}
+            for job in service.jobs():
+                statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+            self._respond(200, {"status": "ok", "jobs": statuses})
+        elif url.path == "/jobs":
+            self._respond(200, {"jobs": service.jobs()})
+        elif url.path.startswith("/jobs/"):
+            job = service.job(url.path.removeprefix("/jobs/"), self._wait(parse_qs(url.query)))
+            if job is None:
+                self._respond(404, {"error": "Unknown job."})
+            else:
+                self._respond(200, job)
+        else:
+            self._respond(404, {"error": "Not found."})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/jobs":
+            self._respond(404, {"error": "Not found."})
+            return
+        try:
+            options = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._respond(400, {"error": "Body must be a JSON object of options."})
+            return
+        if not isinstance(options, dict):
+            self._respond(400, {"error": "Body must be a JSON object of options."})
+            return
+        try:
+            job = self.server.service.submit(options)
+        except ValueError as e:
+            self._respond(400, {"error": str(e)})
+            return
+        wait = self._wait(parse_qs(url.query))
+        if wait:
+            job = self.server.service.job(job["id"], wait)
+        self._respond(200 if job["finished_at"] is not None else 202, job)
+
+    def log_message(self, format, *args):
+        # Clients of a Unix socket have no address to log
+        logger.debug(format, *args)
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    HTTP server listening on a Unix socket, handling every connection in a thread of its own.
+    """
+    daemon_threads = True
+
+
+def parse_service_args(argv=None):
+    """
+    Parses command-line arguments of the service.
+    """
+    parser = ArgumentParser(description="Resident migration service")
+    parser.add_argument("--socket", help="Path of the Unix socket to listen on, instead of a TCP port.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8750, help="TCP port to listen on.")
+    parser.add_argument("--work-dir", default=".", help="Directory of the files of jobs (journals, states, caches, metrics and exports).")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output for detailed logging.")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help="Lowest level of logged messages.")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of the log file, JSON Lines with 'json'.")
+    parser.add_argument("--request-log", choices=["all", "summary", "errors"], default="summary", help="Log every HTTP request, failed ones and periodic summaries, or failed ones only.")
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Serves migration jobs until interrupted.
+    """
+    args = parse_service_args()
+    get_logger(args.verbose, args.log_level, args.log_format, args.request_log)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, ServiceRequestHandler)
+        # Jobs write files with the permissions of the service, so only its user may submit them
+        os.chmod(args.socket, 0o600)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ServiceRequestHandler)
+        address = f"http://{args.host}:{args.port}/"
+    server.service = MigrationService(args.work_dir)
+    server.service.start()
+    logger.info("Accepting migration jobs at %s", address)
+    # Terminating the service closes it the same way as interrupting it
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.stop()
+        if args.socket:
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
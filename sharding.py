@@ -0,0 +1,127 @@
+import heapq
+import logging
+import threading
+import multiprocessing
+import logging.handlers
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from graph import DependencyGraph
+from model import Resource
+from journal import TransferJournal
+from metrics import metrics
+from logs import configure_request_log
+
+logger = logging.getLogger(__name__)
+
+# Queue forwarding journal records and log records of a worker process to the parent
+_queue = None
+
+
+def partition_resources(resources: dict[str, Resource], graph: DependencyGraph, shards: int) -> list[dict[str, Resource]]:
+    """
+    Splits resources into at most the given number of shards, which do not depend on each other.
+    Weakly connected components of the dependency graph are packed into the shards largest first,
+    each into the smallest shard so far, so that the shards are about the same size.
+    """
+    nodes = [graph.index[resource_id] for resource_id in resources]
+    components = sorted(graph.weakly_connected_components(nodes), key=len, reverse=True)
+
+    packed = [[] for _ in range(min(shards, len(components)))]
+    sizes = [(0, shard) for shard in range(len(packed))]
+    for component in components:
+        size, shard = heapq.heappop(sizes)
+        packed[shard].extend(component)
+        heapq.heappush(sizes, (size + len(component), shard))
+
+    return [{graph.ids[node]: resources[graph.ids[node]] for node in nodes} for nodes in packed if nodes]
+
+
+class ShardJournal:
+    """
+    Journal of a worker process. It knows the states of its shard's resources recorded by previous
+    runs and forwards every new record to the parent process, which writes the actual journal.
+    """
+    def __init__(self, states: dict[str, str]):
+        self.states = states
+
+    def record(self, resource_ids, state: str):
+        """
+        Records a new state of the given resources.
+        """
+        resource_ids = list(resource_ids)
+        for resource_id in resource_ids:
+            self.states[resource_id] = state
+        _queue.put((resource_ids, state))
+
+
+def _init_worker(queue, level: int, request_log: str):
+    """
+    Forwards the logs of a worker process of the parent's level to the parent, with HTTP requests
+    logged the same way.
+    """
+    global _queue
+    _queue = queue
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(queue)]
+    root.setLevel(level)
+    configure_request_log(request_log)
+
+
+def _forward_records(queue, journal: TransferJournal):
+    """
+    Writes journal records and handles log records sent by the workers, until None is received.
+    """
+    while (item := queue.get()) is not None:
+        if isinstance(item, logging.LogRecord):
+            logging.getLogger(item.name).handle(item)
+        else:
+            journal.record(*item)
+
+
+def run_shards(
+    worker, shards: list[dict[str, Resource]], journal: TransferJournal, args
+) -> tuple[dict[str, float], str | None]:
+    """
+    Transfers every shard in a process of its own, calling worker(resources, states, args), which
+    returns latencies of the transferred resources, metrics of the worker and why its transfer was
+    aborted (None if it was not). Progress of the workers is recorded in the journal of the parent.
+    Returns latencies of all the shards, and why the first failed shard has failed (None if none has).
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    forwarder = threading.Thread(target=_forward_records, args=(queue, journal), daemon=True)
+    forwarder.start()
+
+    latencies, error = {}, None
+    try:
+        with ProcessPoolExecutor(
+            len(shards), mp_context=context, initializer=_init_worker,
+            initargs=(queue, logging.getLogger().getEffectiveLevel(), args.request_log),
+        ) as pool:
+            futures = {
+                pool.submit(worker, shard, {id: journal.states[id] for id in shard if id in journal.states}, args): index
+                for index, shard in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    shard_latencies, shard_metrics, shard_error = future.result()
+                except Exception as e:
+                    failure = f"Shard {index + 1}/{len(shards)} failed: {e!r}"
+                    logger.error(failure)
+                    error = error or failure
+                    continue
+                latencies.update(shard_latencies)
+                metrics.merge(shard_metrics)
+                if shard_error is not None:
+                    failure = f"Shard {index + 1}/{len(shards)} aborted: {shard_error}"
+                    logger.error(failure)
+                    error = error or failure
+                    continue
+                logger.info(
+                    f"Shard {index + 1}/{len(shards)} finished: "
+                    f"{len(shard_latencies)} of {len(shards[index])} resources transferred"
+                )
+    finally:
+        queue.put(None)
+        forwarder.join()
+    return latencies, error
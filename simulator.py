@@ -0,0 +1,257 @@
+import math
+import heapq
+import random
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from graph import DependencyGraph
+from model import Resource
+from scheduling import ReadyQueue, critical_path_priority
+
+BATCH_ENDPOINT = "POST /dataplex_catalog/batch"
+STATUS_ENDPOINT = "POST /dataplex_catalog/status"
+
+
+@dataclass
+class SimulationConfig:
+    """
+    Parameters of the simulated transfer, mirroring the CLI options of the real one.
+    """
+    # Seconds it takes Dataplex to finish a transfer once it accepted it
+    transfer_delay: float = 10.0
+    # Mean round trip of a request in seconds, and its distribution: constant, exponential or lognormal
+    latency: float = 0.02
+    latency_distribution: str = "constant"
+    batch_size: int = 100
+    max_in_flight: int = 50
+    max_active: int = 0
+    min_poll_interval: float = 0.5
+    max_poll_interval: float = 8.0
+    # Whether finished transfers are reported by the watch stream instead of being polled for
+    watch: bool = True
+    policy: object = critical_path_priority
+    seed: int = 0
+
+
+@dataclass
+class SimulationResult:
+    """
+    Predicted outcome of a transfer.
+    """
+    duration: float
+    requests: dict[str, int]
+    peak_in_flight: int
+    # Chain of resources which determined the duration, each one waiting for the previous one
+    critical_path: list[str] = field(default_factory=list)
+
+
+class TransferSimulator:
+    """
+    Discrete-event model of transfer_resources: ready resources are dispatched by the priority
+    policy in batches, requests wait for a free in-flight slot, and the completion of accepted
+    transfers is detected by the polls of a TransferPoller model, with the same adaptive cadence.
+    With watch, finished transfers are reported half a round trip after they finish instead, and
+    nothing is polled. Dataplex accepts a batch when the request reaches it (half of the round trip) and finishes the
+    transfers transfer_delay seconds later. Failures and retries are not modelled.
+    """
+    def __init__(self, resources: dict[str, Resource], graph: DependencyGraph, config: SimulationConfig):
+        self._resources = resources
+        self._graph = graph
+        self._config = config
+        self._random = random.Random(config.seed)
+        self._events = []
+        self._sequence = itertools.count()
+        self.now = 0.0
+
+        self._requests = {BATCH_ENDPOINT: 0, STATUS_ENDPOINT: 0}
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._waiting_requests = deque()
+
+        self._ready = ReadyQueue(graph, config.policy)
+        self._active = 0
+        self._outbound = dict.fromkeys(resources, 0)
+        # The dependency whose completion made the resource ready
+        self._released_by = {}
+        self._finished_at = {}
+        # Time each accepted transfer finishes at in Dataplex
+        self._completes_at = {}
+
+        self._pending = {}
+        self._polling = False
+        self._interval = config.min_poll_interval
+        self._expected_duration = None
+        self._previous_poll = 0.0
+
+    def _schedule(self, delay: float, callback, *args):
+        heapq.heappush(self._events, (self.now + delay, next(self._sequence), callback, args))
+
+    def _latency(self) -> float:
+        mean, distribution = self._config.latency, self._config.latency_distribution
+        if distribution == "exponential":
+            return self._random.expovariate(1 / mean) if mean > 0 else 0.0
+        if distribution == "lognormal":
+            sigma = 0.5
+            return self._random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma) if mean > 0 else 0.0
+        return mean
+
+    def _request(self, endpoint: str, on_arrival, on_response):
+        """
+        Sends a request once an in-flight slot is free. on_arrival is called when it reaches
+        Dataplex and its result is passed to on_response.
+        """
+        self._requests[endpoint] += 1
+        if self._in_flight >= self._config.max_in_flight:
+            self._waiting_requests.append((on_arrival, on_response))
+            return
+        self._send(on_arrival, on_response)
+
+    def _send(self, on_arrival, on_response):
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        latency = self._latency()
+        self._schedule(latency / 2, self._arrive, on_arrival, on_response, latency / 2)
+
+    def _arrive(self, on_arrival, on_response, remaining: float):
+        self._schedule(remaining, self._respond, on_response, on_arrival())
+
+    def _respond(self, on_response, result):
+        self._in_flight -= 1
+        if self._waiting_requests:
+            # Waiting requests take the slot in the order they were sent
+            self._send(*self._waiting_requests.popleft())
+        on_response(result)
+
+    def _start_ready(self):
+        max_active = self._config.max_active
+        capacity = max_active - self._active if max_active else len(self._ready)
+        resource_ids = self._ready.pop_many(max(0, capacity))
+        self._active += len(resource_ids)
+        for start in range(0, len(resource_ids), self._config.batch_size):
+            batch = resource_ids[start : start + self._config.batch_size]
+            self._request(BATCH_ENDPOINT, lambda batch=batch: self._accept(batch), self._watch)
+
+    def _accept(self, batch: list[str]) -> list[str]:
+        completes_at = self.now + self._config.transfer_delay
+        for resource_id in batch:
+            self._completes_at[resource_id] = completes_at
+        return batch
+
+    def _watch(self, batch: list[str]):
+        if self._config.watch:
+            # The whole batch was accepted at once, so it finishes at once
+            delay = max(0.0, self._completes_at[batch[0]] - self.now) + self._latency() / 2
+            self._schedule(delay, self._notify, batch)
+            return
+        for resource_id in batch:
+            self._pending[resource_id] = self.now
+        if not self._polling:
+            self._polling = True
+            self._interval = self._config.min_poll_interval
+            self._schedule(self._next_delay(), self._poll)
+
+    def _notify(self, batch: list[str]):
+        for resource_id in batch:
+            self._complete(resource_id)
+        self._start_ready()
+
+    def _next_delay(self) -> float:
+        if self._expected_duration is not None:
+            until_expected = min(self._pending.values()) + self._expected_duration - self.now
+            if until_expected > self._config.min_poll_interval:
+                self._interval = self._config.min_poll_interval
+                return min(until_expected, self._config.max_poll_interval)
+        return self._interval
+
+    def _poll(self):
+        polled_at = self.now
+        resource_ids = list(self._pending)
+        batches = [
+            resource_ids[start : start + self._config.batch_size]
+            for start in range(0, len(resource_ids), self._config.batch_size)
+        ]
+        statuses, responses = {}, [len(batches)]
+
+        def check(batch):
+            return {id: self._completes_at[id] <= self.now for id in batch}
+
+        def collect(result):
+            statuses.update(result)
+            responses[0] -= 1
+            if not responses[0]:
+                self._process_poll(polled_at, statuses)
+
+        for batch in batches:
+            self._request(STATUS_ENDPOINT, lambda batch=batch: check(batch), collect)
+
+    def _process_poll(self, polled_at: float, statuses: dict[str, bool]):
+        finished = [id for id, transfer_finished in statuses.items() if transfer_finished]
+        for resource_id in finished:
+            started = self._pending.pop(resource_id)
+            if self._previous_poll > started:
+                duration = self._previous_poll - started
+                self._expected_duration = (
+                    duration if self._expected_duration is None else 0.8 * self._expected_duration + 0.2 * duration
+                )
+        self._previous_poll = polled_at
+        if finished:
+            self._interval = self._config.min_poll_interval
+        else:
+            self._interval = min(self._interval * 2, self._config.max_poll_interval)
+
+        for resource_id in finished:
+            self._complete(resource_id)
+        self._start_ready()
+
+        if self._pending:
+            self._schedule(self._next_delay(), self._poll)
+        else:
+            self._polling = False
+
+    def _complete(self, resource_id: str):
+        self._active -= 1
+        self._finished_at[resource_id] = self.now
+        for backref in self._graph.backrefs_of(resource_id):
+            if backref not in self._outbound:
+                continue
+            self._outbound[backref] -= 1
+            if self._outbound[backref] == 0:
+                self._released_by[backref] = resource_id
+                self._ready.push(backref)
+
+    def run(self) -> SimulationResult:
+        """
+        Simulates the transfer of all the resources.
+        """
+        for resource_id in self._resources:
+            for backref in self._graph.backrefs_of(resource_id):
+                if backref in self._outbound:
+                    self._outbound[backref] += 1
+        for resource_id, count in self._outbound.items():
+            if count == 0:
+                self._ready.push(resource_id)
+        self._start_ready()
+
+        while self._events:
+            self.now, _, callback, args = heapq.heappop(self._events)
+            callback(*args)
+
+        critical_path = []
+        if self._finished_at:
+            resource_id = max(self._finished_at, key=self._finished_at.get)
+            while resource_id is not None:
+                critical_path.append(resource_id)
+                resource_id = self._released_by.get(resource_id)
+        return SimulationResult(
+            duration=self.now,
+            requests=self._requests,
+            peak_in_flight=self._peak_in_flight,
+            critical_path=critical_path[::-1],
+        )
+
+
+def simulate_transfer(resources: dict[str, Resource], graph: DependencyGraph, config: SimulationConfig) -> SimulationResult:
+    """
+    Predicts duration and request volume of transferring the resources, see TransferSimulator.
+    """
+    return TransferSimulator(resources, graph, config).run()
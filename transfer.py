@@ -1,198 +1,764 @@
 
+from __future__ import annotations
+
 import sys
+import time
 import asyncio
-from client.data_catalog import DataCatalogClient
-from client.dataplex_catalog import DataplexCatalogClient
+import logging
+import contextlib
+from typing import TYPE_CHECKING
+from client.http_cache import HttpCache
+from client.catalog_export import CatalogExportSource, CatalogExportWriter
+from journal import TransferJournal, PENDING, INITIATED, FINISHED, FAILED
+from delta import content_hash, load_state, save_state, select_changed_resources
 from utils import parse_cli_args, get_logger
 from exceptions import AppException
-
-API_BASE_URL = "http://127.0.0.1:5000/"
-
-# Parse CLI arguments
-args = parse_cli_args()
-
-# Initialize loggers
-logger = get_logger(args.verbose)
-
-
-def find_duplicates(resources: list[dict]) -> set:
+from graph import DependencyGraph, GraphValidation
+from model import Resource
+from dedup import DuplicateDetector, describe_duplicates, remove_duplicates
+from online import OnlineValidator
+from metrics import Metrics, metrics, profiled
+from logs import flush_request_log
+from scheduling import PRIORITY_POLICIES, ReadyQueue, critical_path_priority, fifo_priority
+from migration import MigrationResult
+
+if TYPE_CHECKING:
+    # The HTTP clients are imported by the functions using them, so that the CLI starts without httpx
+    from client.data_catalog import DataCatalogClient
+    from client.dataplex_catalog import DataplexCatalogClient
+    from client.transfer_poller import TransferPoller
+    from client.pool import ClientPool
+
+# Handlers are configured by get_logger when running from the CLI
+logger = logging.getLogger(__name__)
+
+
+def find_duplicates(resources: list[Resource]) -> set:
     """
     Finds duplicate resource IDs in the given list of resources.
     """
-    collector = set()
-    duplicates = set()
-    for resource in resources:
-        if resource["id"] in collector:
-            duplicates.add(resource["id"])
-        collector.add(resource["id"])
-    return duplicates
+    detector = DuplicateDetector()
+    detector.add_page(resources)
+    return set(detector.finish(resources))
 
 
-def deduplicate_resources(resources: list[dict], duplicates: set) -> None:
+def deduplicate_resources(resources: list[Resource], duplicates: set) -> None:
     """
     Removes resources with duplicate IDs from the provided list.
     """
-    if len(duplicates) > 0:
-        logger.info("Resources before deduplication: ", resources)
-        resources[:] = [r for r in resources if r["id"] not in duplicates]
-        logger.info("Resources before deduplication: ", resources)
+    removed = remove_duplicates(resources, duplicates)
+    if removed:
+        logger.info(f"Removed {removed} resources with duplicate ids, {len(resources)} resources left")
 
 
-def validate_dependencies(resources: list[dict]):
+def validate_dependencies(resources: list[Resource], transferred: set = frozenset()):
     """
     Validates the dependencies for the provided resources, ensuring that all dependencies exist and
-    are properly referenced.
-    """
-    collector, ref_lookup = {}, {}
-
-    # Collect all resources into an id-indexed dictionary collector
-    # Count outbound dependencies and all dependant resources for each resource
-    for resource in resources:
-        collector[resource["id"]] = resource
-        if resource["id"] not in ref_lookup:
-            ref_lookup[resource["id"]] = {"outbound": 0, "backrefs": []}
-        if "dependencies" not in resource:
-            continue
-        for dep in resource["dependencies"]:
-            if dep not in ref_lookup:
-                ref_lookup[dep] = {"outbound": 0, "backrefs": []}
-            ref_lookup[dep]["backrefs"].append(resource["id"])
-            ref_lookup[resource["id"]]["outbound"] += 1
+    are properly referenced. Dependencies on already transferred resources are considered satisfied.
+    Returns valid resources grouped in layers, and the dependency graph.
+    """
+    graph = DependencyGraph.from_resources(resources, transferred)
+    result = graph.validate()
 
-    # Missing dependency list includes both resources that do not exist, and resources that exist but depend on non-existing ones
-    missing_dependencies, layer, visited = set(), set(), set()
-    
-    # Build a first layer, checking for resource existence 
-    for id in ref_lookup:
-        if ref_lookup[id]["outbound"] == 0:
-            layer.add(id)
-        if id not in collector:
-            missing_dependencies.add(id)
+    collector = {resource.id: resource for resource in resources}
 
     # To avoid rewalking the tree when doing actual transfer, we save the layers
-    layer_log = []
-
-    # Process dependencies layer by layer
-    while len(layer) > 0:
-        next_layer = set()
-        for resource_id in layer:
-            # Update all the dependents
-            for backref in ref_lookup[resource_id]["backrefs"]:
-                # Propagate the reason of unability to transfer, if the dependency does not exist in resources
-                if resource_id in missing_dependencies:
-                    missing_dependencies.add(backref)
-                # Decrease outbound reference counter for dependent
-                ref_lookup[backref]["outbound"] -= 1
-
-                # If current resource was the last unresolved dependency, the dependent can now be added the next layer
-                if ref_lookup[backref]["outbound"] == 0:
-                    next_layer.add(backref)
-            # Only add the existing dependencies to visited
-            if resource_id in collector:
-                visited.add(resource_id)
-        # Adding all the resource data to layer log, not only id
-        layer_log.append(
-            list(
-                map(
-                    lambda id: collector[id],
-                    visited.intersection(layer) - missing_dependencies,
-                )
-            )
-        )
-        layer = next_layer
+    layer_log = [[collector[graph.ids[node]] for node in layer] for layer in result.layers]
+
+    log_invalid_resources(graph, result)
+
+    valid = {resource.id for layer in layer_log for resource in layer}
+    if valid:
+        logger.info("Valid resources acceptable for transfer: %s", valid)
 
-    # Visited does not include missing
-    if len(visited) < len(resources):
+    return layer_log, graph
+
+
+def log_invalid_resources(graph: DependencyGraph, result: GraphValidation):
+    """
+    Logs the resources which are not valid, with the reason.
+    """
+    if result.cycle_members or result.blocked_by_cycles:
         logger.info("Detected cyclical dependencies.")
 
-    # Since existing resource may be in missing_dependencies because of it's dependency of non-existing one
-    valid = visited - missing_dependencies
+    # Missing dependency list includes both resources that do not exist, and resources that exist but depend on non-existing ones
+    if result.missing:
+        logger.info("Missing dependencies: %s", {graph.ids[node] for node in result.missing})
+
+    if result.cycle_members:
+        logger.info("Elements forming cycles: %s", {graph.ids[node] for node in result.cycle_members})
+
+    if result.blocked_by_cycles:
+        logger.info("Elements depending on cycles: %s", {graph.ids[node] for node in result.blocked_by_cycles})
+
+
+async def transfer_resources(
+    client: DataplexCatalogClient,
+    poller: TransferPoller,
+    journal: TransferJournal,
+    resources: dict[str, Resource],
+    graph: DependencyGraph,
+    replace: bool = False,
+    policy=critical_path_priority,
+    max_active: int = 0,
+    incoming: asyncio.Queue | None = None,
+):
+    """
+    Transfers resources following the dependency graph built by validate_dependencies.
+
+    Every resource becomes ready as soon as all of its own dependencies have finished transferring,
+    so a slow resource only delays the resources that actually depend on it. Ready resources are
+    dispatched in the order of the priority policy, at most max_active of them (0 for unlimited)
+    being transferred at the same time. Resources dispatched together are initiated in batches of
+    the client's batch size, and the completion of all initiated resources is tracked by the shared
+    poller.
+
+    With an incoming queue, more resources are received while transferring: lists of resources
+    whose dependencies are among the resources received before, until None. The graph is then an
+    OnlineValidator, which knows the dependents of the resources received so far.
+
+    Every state change is recorded in the journal. Resources the journal knows as finished are not
+    transferred again, and resources a previous run has tried to transfer are polled for completion
+    if Dataplex already has them.
+
+    Returns latencies of the resources transferred. If a transfer fails, the transfers in flight
+    are cancelled and its AppException is raised.
+    """
+    # Count outbound dependencies among the resources being transferred, using backrefs of the graph
+    outbound = dict.fromkeys(resources, 0)
+    for resource_id in resources:
+        for backref in graph.backrefs_of(resource_id):
+            if backref in outbound:
+                outbound[backref] += 1
+
+    # Tasks initiating a batch of resources and poller futures of a single resource completion
+    initiating, polling = {}, {}
+    # Tasks and futures which are done, in the order they got done. Waiting for this queue instead of
+    # all of them with asyncio.wait keeps every wakeup cheap, however many resources are pending
+    settled = asyncio.Queue()
+    # Resources which are not to be initiated anymore, and resources which have finished transferring
+    scheduled, completed = set(), set()
+    initiated_at, accepted_at, latencies = {}, {}, {}
+    ready = ReadyQueue(graph, policy)
+    for resource_id, count in outbound.items():
+        if count == 0:
+            ready.push(resource_id)
+    # Resources initiated or being polled, which have not finished yet
+    active = 0
+
+    def start_ready():
+        nonlocal active
+        capacity = max_active - active if max_active else len(ready)
+        while capacity > 0 and ready:
+            resource_ids = [id for id in ready.pop_many(capacity) if id not in scheduled]
+            start(resource_ids)
+            active += len(resource_ids)
+            capacity -= len(resource_ids)
+
+    def start(resource_ids):
+        scheduled.update(resource_ids)
+        now = time.monotonic()
+        initiated_at.update((id, now) for id in resource_ids)
+        metrics.add("resources_in_flight", len(resource_ids))
+        for batch in client.batched(resource_ids):
+            journal.record(batch, PENDING)
+            task = asyncio.create_task(
+                client.initiate_batch_transfer([resources[id] for id in batch], replace)
+            )
+            task.add_done_callback(settled.put_nowait)
+            initiating[task] = batch
+
+    def watch(resource_id):
+        future = poller.watch(resource_id)
+        future.add_done_callback(settled.put_nowait)
+        polling[future] = resource_id
+
+    def complete(resource_id):
+        completed.add(resource_id)
+        # Start every dependent for which this resource was the last unfinished dependency
+        for backref in graph.backrefs_of(resource_id):
+            if backref not in outbound:
+                continue
+            outbound[backref] -= 1
+            if outbound[backref] == 0:
+                ready.push(backref)
+
+    async def resume(resource_ids) -> set:
+        """
+        Completes the resources known as finished and polls the ones still transferring.
+        Returns ids of the finished ones.
+        """
+        nonlocal active
+        finished = {id for id in resource_ids if journal.states.get(id) == FINISHED}
+        # The previous run may have crashed right after initiating these, Dataplex knows better.
+        # Replaced resources are present in Dataplex anyway, so only initiated ones are worth checking
+        unsure = [
+            id
+            for id in resource_ids
+            if journal.states.get(id) == INITIATED
+            or (not replace and id in journal.states and id not in finished)
+        ]
+        statuses = await client.get_transfer_statuses(unsure) if unsure else {}
+        finished.update(id for id, transfer_finished in statuses.items() if transfer_finished)
+        if finished or statuses:
+            logger.info(
+                f"Resuming transfer: {len(finished)} resources already transferred, "
+                f"{len(statuses) - sum(statuses.values())} still transferring"
+            )
+
+        scheduled.update(finished, statuses)
+        for resource_id in finished:
+            complete(resource_id)
+        for resource_id, transfer_finished in statuses.items():
+            if not transfer_finished:
+                watch(resource_id)
+                active += 1
+        return finished
+
+    async def receive(received: list[Resource]) -> set:
+        """
+        Adds received resources, which depend only on resources received before.
+        Returns ids of the ones known as finished.
+        """
+        for resource in received:
+            outbound[resource.id] = sum(
+                1 for d in dict.fromkeys(resource.dependencies) if d in outbound and d not in completed
+            )
+            resources[resource.id] = resource
+            if outbound[resource.id] == 0:
+                ready.push(resource.id)
+        return await resume([resource.id for resource in received])
+
+    finished = await resume(list(resources))
+    if incoming is None:
+        logger.info(f"Starting transfer of {len(resources) - len(finished)} resources")
+    else:
+        logger.info(f"Starting transfer of {len(resources) - len(finished)} resources, receiving more")
+    transferred = len(finished)
+    start_ready()
+
+    def start_receiving():
+        task = asyncio.ensure_future(incoming.get())
+        task.add_done_callback(settled.put_nowait)
+        return task
+
+    receiving = start_receiving() if incoming is not None else None
 
-    # If there are resources left unprocessed, they still have outbound ref counter > 0
-    cycle_elements = set(collector) - visited - missing_dependencies
+    try:
+        while initiating or polling or receiving:
+            done = [await settled.get()]
+            while not settled.empty():
+                done.append(settled.get_nowait())
+            for task in done:
+                if task is receiving:
+                    # Resources received meanwhile are taken together, so that they fill whole batches
+                    received, item = [], task.result()
+                    while item is not None:
+                        received.extend(item)
+                        if incoming.empty():
+                            break
+                        item = incoming.get_nowait()
+                    if received:
+                        transferred += len(await receive(received))
+                    receiving = start_receiving() if item is not None else None
+                    continue
+
+                resource_ids = initiating[task] if task in initiating else [polling[task]]
+                try:
+                    task.result()  # re-raises the transfer error, if any
+                except AppException as e:
+                    journal.record(resource_ids, FAILED)
+                    metrics.error("initiate" if task in initiating else "poll", e)
+                    (initiating if task in initiating else polling).pop(task)
+                    raise
+
+                now = time.monotonic()
+                if task in initiating:
+                    del initiating[task]
+                    journal.record(resource_ids, INITIATED)
+                    metrics.observe("initiate_seconds", now - initiated_at[resource_ids[0]])
+                    accepted_at.update((id, now) for id in resource_ids)
+                    for resource_id in resource_ids:
+                        watch(resource_id)
+                    continue
+
+                resource_id = polling.pop(task)
+                journal.record(resource_ids, FINISHED)
+                metrics.inc("resources_transferred_total")
+                if resource_id in accepted_at:
+                    # Time spent polling until Dataplex has finished the transfer
+                    metrics.observe("completion_wait_seconds", now - accepted_at.pop(resource_id))
+                if resource_id in initiated_at:
+                    latencies[resource_id] = now - initiated_at[resource_id]
+                    metrics.observe("resource_transfer_seconds", latencies[resource_id])
+                    metrics.add("resources_in_flight", -1)
+                transferred += 1
+                active -= 1
+                logger.info("Resource '%s' transferred (%d/%d)", resource_id, transferred, len(resources))
+                complete(resource_id)
+            start_ready()
+    except AppException as e:
+        logger.error(f"Unable to transfer resources: '{str(e)}'. Aborting.")
+        raise
+    finally:
+        # Transfers in flight are cancelled however the loop ends, cancellation of this one included
+        for task in initiating.keys() | polling.keys():
+            task.cancel()
+        if receiving is not None:
+            receiving.cancel()
+        await asyncio.gather(*initiating, return_exceptions=True)
+        # Batches done before the cancellation were accepted, the others may or may not have been
+        for task, resource_ids in initiating.items():
+            failed = task.cancelled() or task.exception() is not None
+            journal.record(resource_ids, FAILED if failed else INITIATED)
+
+    logger.info("Data successfully transfered! 🐒")
+    return latencies
+
+
+def _borrowed(client):
+    """
+    Returns a context of a client given by the caller, which leaves it open, or None if there is no client.
+    """
+    return contextlib.nullcontext(client) if client is not None else None
 
-    if len(missing_dependencies): 
-        logger.info("Missing dependencies: " + str(missing_dependencies))
 
-    if len(cycle_elements):
-        logger.info("Elements forming cycles: " + str(cycle_elements))
+def open_catalog_source(args, cache: HttpCache | None, clients: ClientPool | None = None):
+    """
+    Returns the source of resources configured by CLI args, to be opened with async with: the
+    catalog export of a file:// source, otherwise the Data Catalog client (the one of the pool,
+    if given, is left open).
+    """
+    if args.source is not None:
+        return CatalogExportSource(args.source.removeprefix("file://"), page_size=args.page_size)
+    if clients is not None:
+        return _borrowed(clients.data_catalog(args))
+    from client.data_catalog import DataCatalogClient
 
-    if len(valid):
-        logger.info("Valid resources acceptable for transfer: " + str(valid))
+    return DataCatalogClient(args.api_url, page_size=args.page_size, cache=cache)
 
-    return layer_log
+
+def export_resources(resources: list[Resource], path: str):
+    """
+    Writes the fetched resources into a catalog export.
+    """
+    with CatalogExportWriter(path) as writer:
+        writer.write(resources)
+    logger.info(f"Exported {writer.count} resources to {path}")
+
+
+async def fetch_resources(
+    api_base_url: str,
+    page_size: int,
+    cache: HttpCache | None = None,
+    detector: DuplicateDetector | None = None,
+    client: DataCatalogClient | None = None,
+) -> list[Resource]:
+    """
+    Fetches resources of all types from the Data Catalog, page by page.
+    Each page is passed to the duplicate detector, if given, as soon as it arrives.
+    The client, if given, is used instead of a new one and left open.
+    """
+    from client.data_catalog import DataCatalogClient
+
+    resources = []
+    async with _borrowed(client) or DataCatalogClient(api_base_url, page_size=page_size, cache=cache) as client:
+        async for page in client.iter_pages():
+            if detector is not None:
+                detector.add_page(page)
+            resources.extend(page)
+    return resources
+
+
+async def transfer_with_client(
+    resources: dict[str, Resource],
+    graph: DependencyGraph,
+    journal,
+    args,
+    incoming: asyncio.Queue | None = None,
+    client: DataplexCatalogClient | None = None,
+) -> dict:
+    """
+    Transfers resources through one Dataplex client shared by the whole process, configured by CLI
+    args. With more workers, each of them gets an equal share of the connection and in-flight limits.
+    Resources received from the incoming queue, if given, are dispatched in the order they become
+    ready, as their priorities are not known. Returns latencies of the resources transferred.
+    The client, if given, is used instead of a new one and left open.
+    """
+    from client.dataplex_catalog import DataplexCatalogClient
+    from client.transfer_poller import TransferPoller
+
+    workers = max(1, args.workers) if incoming is None else 1
+    max_active = -(-args.max_active_transfers // workers)
+    async with _borrowed(client) or DataplexCatalogClient(
+        args.api_url,
+        max_connections=-(-args.max_connections // workers),
+        max_in_flight=-(-args.max_in_flight // workers),
+        http2=args.http2,
+        batch_size=args.batch_size,
+        max_retries=args.max_retries,
+    ) as client, TransferPoller(
+        client,
+        min_interval=args.poll_interval,
+        max_interval=args.max_poll_interval,
+        timeout=args.transfer_timeout,
+        watch=not args.no_watch,
+    ) as poller:
+        return await transfer_resources(
+            client,
+            poller,
+            journal,
+            resources,
+            graph,
+            replace=args.delta,
+            policy=PRIORITY_POLICIES[args.priority] if incoming is None else fifo_priority,
+            max_active=max_active,
+            incoming=incoming,
+        )
 
 
-async def transfer_resource(resource):
+def transfer_shard(resources: dict[str, Resource], states: dict[str, str], args) -> tuple[dict, Metrics, str | None]:
     """
-    Initiates and monitors the transfer of a single resource.
+    Transfers a shard of resources in a worker process. Resume states of the shard are given by
+    the parent, which also receives all the journal records. Returns latencies of the resources
+    transferred, metrics of the worker, and why the transfer was aborted (None if it was not).
     """
-    client = DataplexCatalogClient(API_BASE_URL)
-    if resource["type"] == "EntryGroup":
-        await client.initiate_entrygroup_transfer(resource)
-        return await client.poll_for_entrygroup_transfer_completion(resource["id"])
-    if resource["type"] == "TagTemplate":
-        # just in case some other resource type was able to crawl here we will have explicit type check
-        await client.initiate_tag_template_transfer(resource)
-        return await client.poll_for_tag_template_transfer_completion(resource["id"])
+    from sharding import ShardJournal
 
+    # Dependencies outside of the shard are not transferred by this run
+    external = {d for r in resources.values() for d in r.dependencies if d not in resources}
+    graph = DependencyGraph.from_resources(resources.values(), transferred=external)
+    graph.validate()  # computes transfer priorities
+    latencies, error = asyncio.run(transfer_or_abort(resources, graph, ShardJournal(states), args))
+    # Worker processes exit without running atexit handlers
+    flush_request_log()
+    return latencies, metrics, error
 
-async def transfer_layered_resources(layers):
+
+async def transfer_or_abort(
+    resources: dict[str, Resource], graph: DependencyGraph, journal, args, client: DataplexCatalogClient | None = None
+) -> tuple[dict, str | None]:
     """
-    Transfers resources in layers, ensuring dependencies are handled first.
+    Transfers resources with transfer_with_client. Returns latencies of the resources transferred
+    and why the transfer was aborted, None if it was not.
     """
-    logger.info("Starting layered transfer")
+    latencies = {}
     try:
-        for i in range(len(layers)):
-            logger.info(f"Transferring layer {i+1} ...")
-            await asyncio.gather(
-                *[transfer_resource(resource) for resource in layers[i]]
-            )
-            logger.info("Layer data successfully transfered! 🐒")
+        latencies = await transfer_with_client(resources, graph, journal, args, client=client)
     except AppException as e:
-        logger.error(f"Unable to transfer resources in layer: '{str(e)}'. Aborting.")
+        return latencies, "Unable to transfer resources: " + str(e)
+    return latencies, None
 
 
-def main():
+async def transfer_valid_resources(
+    resources: dict[str, Resource], graph: DependencyGraph, args, client: DataplexCatalogClient | None = None
+) -> tuple[set, dict, str | None]:
     """
-    Main function to coordinate the data catalog processing and resource transfer.
+    Transfers resources, configured by CLI args. With more than one worker, resources are split into
+    shards without dependencies between them, and each shard is transferred by a process of its own
+    (with a client of its own). Returns ids of the resources which are transferred, latencies of the
+    ones transferred by this run, and why the transfer was aborted (None if it was not).
+    """
+    with TransferJournal(args.journal, resume=args.resume) as journal:
+        shards = []
+        if args.workers > 1:
+            # Worker processes are needed only by sharded transfers
+            from sharding import partition_resources, run_shards
+
+            shards = partition_resources(resources, graph, args.workers)
+        if len(shards) > 1:
+            logger.info(f"Transferring {len(resources)} resources in {len(shards)} shards")
+            # Waiting for the worker processes blocks, so it is done in a thread to keep the event loop running
+            latencies, error = await asyncio.to_thread(run_shards, transfer_shard, shards, journal, args)
+        else:
+            latencies, error = await transfer_or_abort(resources, graph, journal, args, client)
+        return {id for id in resources if journal.states.get(id) == FINISHED}, latencies, error
+
+
+def run_transfer(resources: dict[str, Resource], graph: DependencyGraph, args) -> tuple[set, dict, str | None]:
     """
-    data_catalog_client = DataCatalogClient(API_BASE_URL)
+    Transfers resources in a new event loop, see transfer_valid_resources.
+    """
+    return asyncio.run(transfer_valid_resources(resources, graph, args))
+
+
+def simulate_dry_run(resources: dict[str, Resource], graph: DependencyGraph, args):
+    """
+    Predicts the duration and the request volume of transferring the resources, configured by CLI args.
+    Returns the simulator.SimulationResult.
+    """
+    from simulator import SimulationConfig, simulate_transfer
+
+    result = simulate_transfer(
+        resources,
+        graph,
+        SimulationConfig(
+            transfer_delay=args.sim_transfer_delay,
+            latency=args.sim_latency,
+            latency_distribution=args.sim_latency_distribution,
+            batch_size=args.batch_size,
+            max_in_flight=args.max_in_flight,
+            max_active=args.max_active_transfers,
+            min_poll_interval=args.poll_interval,
+            max_poll_interval=args.max_poll_interval,
+            watch=not args.no_watch,
+            policy=PRIORITY_POLICIES[args.priority],
+        ),
+    )
+    logger.info(f"Dry run: transfer of {len(resources)} resources is predicted to take {result.duration:.1f} s")
+    logger.info(
+        "Predicted requests: " + ", ".join(f"{endpoint}: {count}" for endpoint, count in result.requests.items())
+    )
+    logger.info(f"Predicted peak of in-flight requests: {result.peak_in_flight}")
+    if result.critical_path:
+        logger.info(
+            f"Critical path ({len(result.critical_path)} resources): " + " -> ".join(result.critical_path)
+        )
+    return result
 
+
+async def feed_validator(
+    validator: OnlineValidator,
+    incoming: asyncio.Queue,
+    cache: HttpCache | None,
+    previous: dict[str, str],
+    args,
+    clients: ClientPool | None = None,
+) -> str | None:
+    """
+    Fetches resources into the online validator page by page, putting the resources which become
+    valid on the incoming queue of the transfer, and None once the fetch is over. With delta sync,
+    resources unchanged since the previous run are validated, but not transferred. With an export,
+    pages are written into it as they arrive, and the export is kept only if the fetch completes.
+
+    Returns why the migration has failed, None if all the resources were fetched and valid (or
+    validation errors are ignored). Without ignoring validation errors, the fetch stops at the
+    first duplicate.
+    """
+    writer = None
     try:
-        entry_groups = data_catalog_client.get_entry_groups()
-        tag_templates = data_catalog_client.get_tag_templates()
+        if args.export:
+            writer = CatalogExportWriter(args.export)
+        async with open_catalog_source(args, cache, clients) as source:
+            async for page in source.iter_pages():
+                if writer is not None:
+                    writer.write(page)
+                valid = []
+                for resource in page:
+                    unchanged = args.delta and previous.get(resource.id) == content_hash(resource)
+                    valid.extend(validator.add(resource, unchanged))
+                if valid:
+                    incoming.put_nowait(valid)
+                if validator.duplicates and not args.ignore_validation_errors:
+                    logger.error(
+                        "Duplicate resource identifiers found in source data, no more resources are transferred: "
+                        + describe_duplicates(validator.duplicates)
+                    )
+                    metrics.inc("duplicate_ids_total", len(validator.duplicates))
+                    return "Duplicate resource identifiers found in source data."
+        if writer is not None:
+            writer.close()
+            logger.info(f"Exported {writer.count} resources to {args.export}")
+            writer = None
     except AppException as e:
+        metrics.error("fetch", e)
         logger.critical("Unable to fetch data: " + str(e))
-        sys.exit(1)
+        return "Unable to fetch data: " + str(e)
+    finally:
+        if writer is not None:
+            # The fetch has not completed
+            writer.discard()
+        incoming.put_nowait(None)
+
+    if validator.duplicates:
+        logger.warning(
+            "Duplicate resource identifiers found in source data, the first resource of each was transferred: "
+            + describe_duplicates(validator.duplicates)
+        )
+        metrics.inc("duplicate_ids_total", len(validator.duplicates))
+    if args.delta:
+        logger.info(
+            f"Delta sync: {len(validator) - len(validator.unchanged)} new or changed valid resources, "
+            f"{len(validator.unchanged)} unchanged"
+        )
 
-    resources = entry_groups + tag_templates
+    graph, result = validator.finish()
+    log_invalid_resources(graph, result)
+    if len(validator) != len(validator.resources):
+        logger.warning("Validation for some of the resources has failed.")
+        if not args.ignore_validation_errors:
+            return "Validation for some of the resources has failed."
+    return None
 
-    dups = find_duplicates(resources)
 
+async def transfer_online(
+    validator: OnlineValidator, journal, cache: HttpCache | None, previous: dict[str, str], args, clients: ClientPool | None = None
+) -> str | None:
+    """
+    Fetches, validates and transfers resources at the same time, configured by CLI args, with the
+    clients of the pool if given. Returns why the migration has failed, None if it has not.
+    """
+    incoming = asyncio.Queue()
+    fetching = asyncio.create_task(feed_validator(validator, incoming, cache, previous, args, clients))
+    try:
+        client = clients.dataplex(args) if clients is not None else None
+        await transfer_with_client({}, validator, journal, args, incoming, client)
+    except AppException as e:
+        return "Unable to transfer resources: " + str(e)
+    finally:
+        if not fetching.done():
+            # The transfer has been aborted
+            fetching.cancel()
+        await asyncio.gather(fetching, return_exceptions=True)
+    return fetching.result()
+
+
+async def migrate_online(args, cache: HttpCache | None, clients: ClientPool | None = None) -> MigrationResult:
+    """
+    Transfers every resource as soon as it and all of its dependencies have been fetched and
+    validated, while the fetch is still running. Validation problems are found only as the resources
+    arrive, so the resources validated before are transferred even without ignoring them.
+    """
+    if args.workers > 1:
+        logger.warning("Online transfer runs in a single process, --workers is ignored")
+    previous = load_state(args.state)
+    validator = OnlineValidator()
+    try:
+        with metrics.phase("online"), TransferJournal(args.journal, resume=args.resume) as journal:
+            error = await transfer_online(validator, journal, cache, previous, args, clients)
+            transferred = {id for id in validator.resources if journal.states.get(id) == FINISHED}
+    except ImportError as e:
+        # httpx reports a missing optional "h2" package only when the client is created
+        logger.critical("Unable to create Dataplex client: " + str(e))
+        return MigrationResult(error="Unable to create Dataplex client: " + str(e))
+
+    # Hashes are kept only for resources left unchanged, the others are stored once transferred again
+    state = {id: previous[id] for id in validator.unchanged}
+    state.update((id, content_hash(validator.resources[id])) for id in transferred)
+    save_state(args.state, state)
+    return MigrationResult(
+        error=error,
+        fetched=len(validator.resources) + sum(sum(types.values()) - 1 for types in validator.duplicates.values()),
+        duplicates=sorted(validator.duplicates),
+        invalid=len(validator.resources) - len(validator),
+        valid=len(validator) - len(validator.unchanged),
+        unchanged=len(validator.unchanged),
+        transferred=sorted(transferred),
+    )
+
+
+async def migrate_async(args, clients: ClientPool | None = None) -> MigrationResult:
+    """
+    Coordinates the data catalog processing and resource transfer, configured by CLI args.
+    With a client.pool.ClientPool, its clients and cache are used and left open.
+    """
+    if clients is not None:
+        cache = clients.cache(args)
+    else:
+        cache = None if args.no_cache else HttpCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.online and not args.dry_run:
+        return await migrate_online(args, cache, clients)
+
+    # Duplicates are looked for while the pages are being fetched
+    detector = DuplicateDetector(use_bloom=args.dedup_filter == "bloom")
+    try:
+        with metrics.phase("fetch"):
+            async with open_catalog_source(args, cache, clients) as source:
+                resources = await fetch_resources(args.api_url, args.page_size, cache, detector, source)
+    except AppException as e:
+        metrics.error("fetch", e)
+        logger.critical("Unable to fetch data: " + str(e))
+        return MigrationResult(error="Unable to fetch data: " + str(e))
+    if args.export:
+        try:
+            with metrics.phase("export"):
+                export_resources(resources, args.export)
+        except AppException as e:
+            logger.critical("Unable to export data: " + str(e))
+            return MigrationResult(error="Unable to export data: " + str(e), fetched=len(resources))
+
+    with metrics.phase("dedup"):
+        dups = detector.finish(resources)
+
+    result = MigrationResult(fetched=len(resources), duplicates=sorted(dups))
     if len(dups) > 0:
-        logger.warning(
-            "Duplicate resource identifiers found in source data. Resources: "
-            + ",".join(dups)
-        )
+        logger.warning("Duplicate resource identifiers found in source data: " + describe_duplicates(dups))
+        metrics.inc("duplicate_ids_total", len(dups))
         if not args.ignore_validation_errors:
-            sys.exit(1)
-
-    deduplicate_resources(resources, dups)
+            result.error = "Duplicate resource identifiers found in source data."
+            return result
+
+    with metrics.phase("dedup"):
+        deduplicate_resources(resources, dups)
+
+    previous = load_state(args.state)
+    unchanged = set()
+    if args.delta:
+        resources, unchanged = select_changed_resources(resources, previous)
+        logger.info(
+            f"Delta sync: {len(resources)} new or changed resources, {len(unchanged)} unchanged"
+        )
 
-    layers = validate_dependencies(resources)
+    with metrics.phase("validation"):
+        layers, graph = validate_dependencies(resources, transferred=unchanged)
 
     valid_resource_count = sum([len(l) for l in layers])
+    result.valid, result.unchanged = valid_resource_count, len(unchanged)
+    result.invalid = len(resources) - valid_resource_count
     if valid_resource_count != len(resources):
         # Some resources validation has failed
         logger.warning("Validation for some of the resources has failed.")
         if not args.ignore_validation_errors:
-            sys.exit(1)
+            result.error = "Validation for some of the resources has failed."
+            return result
 
+    valid_resources = {resource.id: resource for layer in layers for resource in layer}
     if args.dry_run:
-        sys.exit(1)
+        with metrics.phase("simulation"):
+            result.simulation = simulate_dry_run(valid_resources, graph, args)
+        return result
 
-    asyncio.run(transfer_layered_resources(layers))
+    try:
+        with metrics.phase("transfer"):
+            client = clients.dataplex(args) if clients is not None else None
+            transferred, _, error = await transfer_valid_resources(valid_resources, graph, args, client)
+    except ImportError as e:
+        # httpx reports a missing optional "h2" package only when the client is created
+        logger.critical("Unable to create Dataplex client: " + str(e))
+        result.error = "Unable to create Dataplex client: " + str(e)
+        return result
+
+    # Hashes are kept only for resources left unchanged, the others are stored once transferred again
+    state = {id: previous[id] for id in unchanged}
+    state.update((id, content_hash(valid_resources[id])) for id in transferred)
+    save_state(args.state, state)
+    result.transferred, result.error = sorted(transferred), error
+    return result
+
+
+def migrate(args) -> MigrationResult:
+    """
+    Coordinates the data catalog processing and resource transfer, configured by CLI args, in a new event loop.
+    """
+    return asyncio.run(migrate_async(args))
+
+
+def main():
+    """
+    Main function to coordinate the data catalog processing and resource transfer.
+    """
+    args = parse_cli_args()
+    get_logger(args.verbose, args.log_level, args.log_format, args.request_log)
+
+    try:
+        with profiled(args.profile, args.profile_output):
+            result = migrate(args)
+    finally:
+        if args.metrics_file:
+            metrics.export(args.metrics_file, args.metrics_format)
+    # Dry runs never proceed to the transfer
+    if not result.succeeded or args.dry_run:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,39 +1,86 @@
 import sys
 import logging
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+from logs import LOG_FILE, BufferedFileHandler, BufferedStreamHandler, JsonFormatter, start_logging
 
+API_BASE_URL = "http://127.0.0.1:5000/"
 
-def parse_cli_args():
+
+def source_url(value: str) -> str:
+    """
+    Validates the URL of a source of resources, only catalog exports (file://PATH) are supported.
+    """
+    if not value.startswith("file://") or value == "file://":
+        raise ArgumentTypeError(f"unsupported source '{value}', expected file://PATH of a catalog export")
+    return value
+
+
+def parse_cli_args(argv=None):
     """
     Parses command-line arguments for the data transfer CLI.
     """
     parser = ArgumentParser(description="CLI for Data Transfer")
     parser.add_argument("-d", "--dry-run", action="store_true", help="Perform a dry run of the operation without making any actual changes.")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output for detailed logging.")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help="Lowest level of logged messages.")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of the log file, JSON Lines with 'json'.")
+    parser.add_argument("--request-log", choices=["all", "summary", "errors"], default="summary", help="Log every HTTP request, failed ones and periodic summaries, or failed ones only.")
     parser.add_argument("-i", "--ignore-validation-errors", action="store_true", help="Skip validation errors and continue with the operation.")
-    return parser.parse_args()
+    parser.add_argument("--api-url", default=API_BASE_URL, help="Base URL of the Data Catalog and Dataplex Catalog APIs.")
+    parser.add_argument("--source", type=source_url, help="Read resources from a catalog export (file://PATH) instead of the Data Catalog API.")
+    parser.add_argument("--export", help="Write the fetched resources into a catalog export (JSON Lines if PATH ends with .jsonl, binary otherwise).")
+    parser.add_argument("--page-size", type=int, default=1000, help="Number of resources requested from the Data Catalog API per page.")
+    parser.add_argument("--max-connections", type=int, default=100, help="Maximum number of pooled connections to the Dataplex API.")
+    parser.add_argument("--max-in-flight", type=int, default=50, help="Maximum number of concurrent requests to the Dataplex API.")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for the Dataplex API (requires the 'h2' package).")
+    parser.add_argument("--batch-size", type=int, default=100, help="Maximum number of resources sent to the Dataplex API in one bulk request.")
+    parser.add_argument("--priority", choices=["critical-path", "dependents", "fifo"], default="critical-path", help="Order in which ready resources are dispatched.")
+    parser.add_argument("--max-active-transfers", type=int, default=0, help="Maximum number of resources being transferred at the same time (0 for unlimited).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes transferring independent shards of resources.")
+    parser.add_argument("--online", action="store_true", help="Validate and transfer resources while they are still being fetched.")
+    parser.add_argument("--max-retries", type=int, default=5, help="Maximum number of retries of a failed Dataplex API request.")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Shortest delay in seconds between transfer status polls.")
+    parser.add_argument("--max-poll-interval", type=float, default=8.0, help="Longest delay in seconds between transfer status polls.")
+    parser.add_argument("--transfer-timeout", type=float, default=300.0, help="Seconds a transfer may take to finish before the run is aborted.")
+    parser.add_argument("--no-watch", action="store_true", help="Poll for finished transfers instead of watching the Dataplex event stream.")
+    parser.add_argument("--dedup-filter", choices=["exact", "bloom"], default="exact", help="How fetched resource ids are tracked to find duplicates.")
+    parser.add_argument("--sim-transfer-delay", type=float, default=10.0, help="Dry run: seconds it takes Dataplex to finish a transfer.")
+    parser.add_argument("--sim-latency", type=float, default=0.02, help="Dry run: mean round trip of a Dataplex API request in seconds.")
+    parser.add_argument("--sim-latency-distribution", choices=["constant", "exponential", "lognormal"], default="constant", help="Dry run: distribution of request round trips.")
+    parser.add_argument("--journal", default="data_catalog_transfer.journal", help="Path of the journal recording the transfer state of each resource.")
+    parser.add_argument("--resume", action="store_true", help="Resume the transfer recorded in the journal, skipping already transferred resources.")
+    parser.add_argument("--state", default="data_catalog_transfer.state.json", help="Path of the file keeping content hashes of transferred resources.")
+    parser.add_argument("--delta", action="store_true", help="Only transfer resources which are new or changed since the previous run, and their dependents.")
+    parser.add_argument("--cache-dir", default="data_catalog_transfer.cache", help="Directory of the Data Catalog response cache.")
+    parser.add_argument("--cache-size", type=int, default=512, help="Maximum size of the Data Catalog response cache in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Always download the whole Data Catalog, without using the cache.")
+    parser.add_argument("--metrics-file", help="Write metrics of the run into the file.")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json", help="Format of the metrics file.")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Profile the run (pyinstrument requires the 'pyinstrument' package).")
+    parser.add_argument("--profile-output", default="data_catalog_transfer.prof", help="Path of the profiler report.")
+    return parser.parse_args(argv)
 
 
-def get_logger(use_stdout):
+def get_logger(use_stdout, level="INFO", log_format="text", request_log="summary"):
     """
     Configures and returns a logger with different handlers for output.
+    Records are written by the handlers in a background thread, see logs.start_logging.
     """
     formatter = logging.Formatter("[%(asctime)s] %(levelname)s : %(message)s")
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
 
-    file_handler = logging.FileHandler("data_catalog_transfer.log")
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
+    file_handler = BufferedFileHandler(LOG_FILE, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else formatter)
+    file_handler.setLevel(level)
+    handlers = [file_handler]
 
-    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler = BufferedStreamHandler(sys.stderr)
     stderr_handler.setLevel(logging.ERROR)
-    logger.addHandler(stderr_handler)
+    handlers.append(stderr_handler)
 
     if use_stdout:
-        stdout_handler = logging.StreamHandler(sys.stdout)
-        stdout_handler.setLevel(logging.INFO)
-        logger.addHandler(stdout_handler)
+        stdout_handler = BufferedStreamHandler(sys.stdout)
+        stdout_handler.setLevel(level)
+        handlers.append(stdout_handler)
 
-    return logger
+    start_logging(handlers, level, request_log)
+    return logging.getLogger()